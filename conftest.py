@@ -1,8 +1,12 @@
 """
 Test configuration and fixtures for Flask application tests.
+
+Every test gets its own copy of a migrated template database, cloned with
+SQLite's backup API, so tests never share state and can run in parallel
+(``python -m pytest -n auto`` with pytest-xdist).
 """
 import os
-import tempfile
+import time
 import pytest
 import sqlite3
 from flask import Flask
@@ -11,35 +15,47 @@ import sys
 # Add the flask_app directory to the Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'flask_app'))
 
-from app import app as flask_app
+from app import app as flask_app, invalidate_listing_caches, admission_control
 import DAL
 
 
+@pytest.fixture(scope='session')
+def template_db(tmp_path_factory):
+    """A fully migrated, empty database kept in memory for cloning."""
+    path = str(tmp_path_factory.mktemp('template') / 'template.db')
+    with DAL.use_db_path(path):
+        DAL.init_db()
+    memory = sqlite3.connect(':memory:', check_same_thread=False)
+    disk = sqlite3.connect(path)
+    disk.backup(memory)
+    disk.close()
+    yield memory
+    memory.close()
+
+
+def clone_database(template: sqlite3.Connection, path: str) -> str:
+    """Copy ``template`` into a new database file at ``path``."""
+    dest = sqlite3.connect(path)
+    try:
+        template.backup(dest)
+    finally:
+        dest.close()
+    return path
+
+
 @pytest.fixture
-def app():
-    """Create and configure a new app instance for each test."""
-    # Create a temporary file to serve as the database
-    db_fd, db_path = tempfile.mkstemp()
-    
-    # Configure the app for testing
-    flask_app.config.update({
-        'TESTING': True,
-        'DATABASE': db_path,
-    })
-    
-    # Override the database path in DAL module
-    original_get_db_path = DAL.get_db_path
-    DAL.get_db_path = lambda: db_path
-    
-    # Initialize the database
-    DAL.init_db()
-    
-    yield flask_app
-    
-    # Cleanup
-    DAL.get_db_path = original_get_db_path
-    os.close(db_fd)
-    os.unlink(db_path)
+def app(template_db, tmp_path, monkeypatch):
+    """The app, pointed at a fresh clone of the template database."""
+    db_path = clone_database(template_db, str(tmp_path / 'projects.db'))
+
+    # Requests read the path from config; direct DAL calls in the test use the override
+    monkeypatch.setitem(flask_app.config, 'TESTING', True)
+    monkeypatch.setitem(flask_app.config, 'PROJECTS_DB_PATH', db_path)
+    with DAL.use_db_path(db_path):
+        invalidate_listing_caches()
+        admission_control.reset()
+        yield flask_app
+    DAL.pool.close_all()
 
 
 @pytest.fixture
@@ -96,3 +112,20 @@ def populated_database(app, sample_projects):
             project['image']
         )
     return sample_projects
+
+
+def pytest_sessionstart(session):
+    session.config.suite_started = time.perf_counter()
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    """Report wall-clock suite time next to the summed time of the tests themselves."""
+    if hasattr(config, 'workerinput'):
+        return  # xdist worker: the controller reports for the whole run
+    reports = [r for stat in terminalreporter.stats.values() for r in stat if hasattr(r, 'duration')]
+    in_tests = sum(r.duration for r in reports)
+    workers = config.getoption('numprocesses', default=None) or 1
+    elapsed = time.perf_counter() - config.suite_started
+    terminalreporter.write_sep(
+        '-', f'suite time {elapsed:.2f}s wall, {in_tests:.2f}s in tests, {workers} worker(s)'
+    )
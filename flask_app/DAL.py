@@ -1,118 +1,645 @@
 import sqlite3
 import os
-from typing import List, Dict, Optional
+import argparse
+import contextlib
+import contextvars
+import datetime
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, ContextManager, Iterator, List, Dict, Optional, Tuple
 
 
 DB_FILENAME = 'projects.db'
 
+# Ordered schema migrations as (version, description, statements). Each one
+# moves the schema from version - 1 to version inside a single transaction
+# that also bumps PRAGMA user_version, so a failed step leaves nothing behind.
+# Never edit a released migration; append a new one instead.
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "create projects table", [
+        """
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            Title TEXT NOT NULL,
+            Description TEXT,
+            ImageFileName TEXT,
+            CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+    ]),
+    (2, "index CreatedAt and Title for sorting and filtering", [
+        "CREATE INDEX IF NOT EXISTS idx_projects_created_at ON projects (CreatedAt, id);",
+        "CREATE INDEX IF NOT EXISTS idx_projects_title ON projects (Title, id);",
+    ]),
+    (3, "make the Title index case-insensitive for title search", [
+        "DROP INDEX IF EXISTS idx_projects_title;",
+        "CREATE INDEX IF NOT EXISTS idx_projects_title_nocase ON projects (Title COLLATE NOCASE, id);",
+    ]),
+    (4, "track idempotency keys of project submissions", [
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            Key TEXT PRIMARY KEY,
+            ProjectId INTEGER NOT NULL,
+            CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (CreatedAt);",
+    ]),
+    (5, "soft delete: DeletedAt tombstones, listing indexes cover live rows only", [
+        "ALTER TABLE projects ADD COLUMN DeletedAt TIMESTAMP;",
+        "DROP INDEX IF EXISTS idx_projects_created_at;",
+        "CREATE INDEX idx_projects_created_at ON projects (CreatedAt, id) WHERE DeletedAt IS NULL;",
+        "DROP INDEX IF EXISTS idx_projects_title_nocase;",
+        "CREATE INDEX idx_projects_title_nocase ON projects (Title COLLATE NOCASE, id) WHERE DeletedAt IS NULL;",
+        "CREATE INDEX idx_projects_deleted_at ON projects (DeletedAt) WHERE DeletedAt IS NOT NULL;",
+    ]),
+    (6, "index live rows by id for the default newest-first listing", [
+        "CREATE INDEX IF NOT EXISTS idx_projects_live_id ON projects (id) WHERE DeletedAt IS NULL;",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Callbacks run as listener(event, project_id) after every committed write,
+# e.g. to invalidate caches or re-export static pages.
+_change_listeners: List[Callable[[str, Optional[int]], None]] = []
+
+
+def add_change_listener(listener: Callable[[str, Optional[int]], None]) -> None:
+    """Register ``listener`` to be called after projects are saved or deleted."""
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+def remove_change_listener(listener: Callable[[str, Optional[int]], None]) -> None:
+    if listener in _change_listeners:
+        _change_listeners.remove(listener)
+
+
+def _notify_change(event: str, project_id: Optional[int]) -> None:
+    for listener in list(_change_listeners):
+        listener(event, project_id)
+
+
+# Called as listener(operation, seconds) after each public query/write function
+_timing_listeners: List[Callable[[str, float], None]] = []
+
+
+def add_timing_listener(listener: Callable[[str, float], None]) -> None:
+    """Time every DAL call (connect included) and report it to ``listener``."""
+    _timing_listeners.append(listener)
+
+
+def remove_timing_listener(listener: Callable[[str, float], None]) -> None:
+    if listener in _timing_listeners:
+        _timing_listeners.remove(listener)
+
+
+# Entered as ``with hook(operation):`` around each DAL call and each connect
+_call_hooks: List[Callable[[str], ContextManager]] = []
+
+
+def add_call_hook(hook: Callable[[str], ContextManager]) -> None:
+    """Wrap every DAL call, and separately every connection it opens, in ``hook(name)``."""
+    _call_hooks.append(hook)
+
+
+def remove_call_hook(hook: Callable[[str], ContextManager]) -> None:
+    if hook in _call_hooks:
+        _call_hooks.remove(hook)
+
+
+def _hooked(operation: str) -> ContextManager:
+    stack = contextlib.ExitStack()
+    for hook in list(_call_hooks):
+        stack.enter_context(hook(operation))
+    return stack
+
+
+def _connect(*args, **kwargs) -> sqlite3.Connection:
+    """``sqlite3.connect``, reported to call hooks as its own ``connect`` step."""
+    if not _call_hooks:
+        return sqlite3.connect(*args, **kwargs)
+    with _hooked('connect'):
+        return sqlite3.connect(*args, **kwargs)
+
+
+class ConnectionPool:
+    """Idle connections kept open for reuse, across every database file (shard).
+
+    At most ``max_idle`` connections stay open in total; when more are
+    returned, the least recently used ones are closed first, so shards that
+    see no traffic give their file handles back. Connections are autocommit
+    (``isolation_level=None``): single statements commit on their own and
+    multi-statement writes use explicit ``BEGIN``/``COMMIT``.
+    """
+
+    def __init__(self, max_idle: int = 32):
+        self.max_idle = max_idle
+        self.opened = 0
+        self.reused = 0
+        self._idle: 'OrderedDict[str, List[sqlite3.Connection]]' = OrderedDict()
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, db_path: str) -> sqlite3.Connection:
+        with self._lock:
+            idle = self._idle.get(db_path)
+            if idle:
+                self._idle.move_to_end(db_path)
+                self._count -= 1
+                self.reused += 1
+                return idle.pop()
+            self.opened += 1
+        return _connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+
+    def release(self, db_path: str, conn: sqlite3.Connection) -> None:
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(db_path, []).append(conn)
+            self._idle.move_to_end(db_path)
+            self._count += 1
+            while self._count > self.max_idle:
+                oldest_path, oldest = next(iter(self._idle.items()))
+                evicted.append(oldest.pop(0))
+                self._count -= 1
+                if not oldest:
+                    del self._idle[oldest_path]
+        for old in evicted:
+            old.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle, self._count = self._idle, OrderedDict(), 0
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'idle': self._count, 'shards': len(self._idle), 'opened': self.opened, 'reused': self.reused}
+
+
+pool = ConnectionPool(int(os.environ.get('DB_POOL_SIZE', 32)))
+
+
+@contextlib.contextmanager
+def _connection():
+    """Borrow a pooled connection to the current database for the ``with`` block."""
+    db_path = get_db_path()
+    conn = pool.acquire(db_path)
+    try:
+        yield conn
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.row_factory = None
+        pool.release(db_path, conn)
+
+
+def _timed(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _timing_listeners and not _call_hooks:
+            return func(*args, **kwargs)
+        with _hooked(func.__name__):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                for listener in list(_timing_listeners):
+                    listener(func.__name__, elapsed)
+    return wrapper
+
+
+# Database for the current context (a request, a test); wins over PROJECTS_DB_PATH
+db_path_override: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('db_path_override', default=None)
+
+
+@contextlib.contextmanager
+def use_db_path(path: str):
+    """Point every DAL call made in this context at ``path`` for the ``with`` block."""
+    token = db_path_override.set(path)
+    try:
+        yield path
+    finally:
+        db_path_override.reset(token)
+
 
 def get_db_path() -> str:
-    """Return the absolute path to the database file next to this module."""
+    """Return the absolute path to the database file.
+
+    A ``use_db_path`` override comes first, then ``PROJECTS_DB_PATH``, then
+    the default location next to this module.
+    """
+    override = db_path_override.get() or os.environ.get('PROJECTS_DB_PATH')
+    if override:
+        return override
     base_dir = os.path.dirname(__file__)
     return os.path.join(base_dir, DB_FILENAME)
 
 
-def init_db() -> None:
-    """Create the projects database and table if they don't already exist."""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
+def get_schema_version() -> int:
+    """Return the schema version recorded in the database (0 if never migrated)."""
+    with _connection() as conn:
+        return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to ``target`` (default: latest) and return the versions applied.
+
+    The database is switched to WAL mode first so that readers keep working
+    while an index is being built; each migration holds the write lock only
+    for its own transaction. Safe to run concurrently from several workers.
+    """
+    target = SCHEMA_VERSION if target is None else target
+    conn = _connect(get_db_path(), timeout=30, isolation_level=None)
+    applied = []
     try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS projects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                Title TEXT NOT NULL,
-                Description TEXT,
-                ImageFileName TEXT,
-                CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """
-        )
-        conn.commit()
+        # auto_vacuum can only be chosen before the first table exists; it lets
+        # maintenance.incremental_vacuum reclaim space after deletes.
+        if conn.execute("SELECT count(*) FROM sqlite_master;").fetchone()[0] == 0:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        conn.execute("PRAGMA journal_mode=WAL;")
+        for version, _description, statements in MIGRATIONS:
+            if version > target:
+                break
+            if conn.execute("PRAGMA user_version;").fetchone()[0] >= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE;")
+            try:
+                # Another worker may have applied it while we waited for the lock
+                if conn.execute("PRAGMA user_version;").fetchone()[0] >= version:
+                    conn.execute("ROLLBACK;")
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {int(version)};")
+                conn.execute("COMMIT;")
+            except Exception:
+                conn.execute("ROLLBACK;")
+                raise
+            applied.append(version)
+        return applied
     finally:
         conn.close()
 
 
+def init_db() -> None:
+    """Create the projects database if needed and bring its schema up to date."""
+    migrate()
+
+
+_initialized_paths = set()
+_init_locks: Dict[str, threading.Lock] = {}
+_init_locks_guard = threading.Lock()
+
+
+def ensure_db() -> bool:
+    """Run ``init_db`` for the current database once per process; return True if it ran now.
+
+    Used to create shard databases lazily on their first request. Each path
+    has its own lock, so one shard's migration never delays another's.
+    """
+    db_path = get_db_path()
+    if db_path in _initialized_paths:
+        return False
+    with _init_locks_guard:
+        lock = _init_locks.setdefault(db_path, threading.Lock())
+    with lock:
+        if db_path in _initialized_paths:
+            return False
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        init_db()
+        _initialized_paths.add(db_path)
+        return True
+
+
+@_timed
 def save_project(title: str, description: str, image_filename: Optional[str] = None) -> int:
     """Insert a project into the database and return the new row id."""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    try:
-        cur = conn.cursor()
-        cur.execute(
+    with _connection() as conn:
+        cur = conn.execute(
             "INSERT INTO projects (Title, Description, ImageFileName) VALUES (?,?,?)",
             (title, description, image_filename or ""),
         )
-        conn.commit()
-        return cur.lastrowid
-    finally:
-        conn.close()
+        project_id = cur.lastrowid
+    _notify_change('save', project_id)
+    return project_id
+
+
+@_timed
+def save_project_once(key: str, title: str, description: str, image_filename: Optional[str] = None) -> Tuple[int, bool]:
+    """Insert a project unless ``key`` was already used; return ``(project_id, created)``.
+
+    Retried or double-clicked submissions carrying the same key get the id of
+    the project the first one created, and nothing is written. The check and
+    the insert share one write transaction, so concurrent duplicates are safe.
+    """
+    with _connection() as conn:
+        conn.execute("BEGIN IMMEDIATE;")
+        row = conn.execute("SELECT ProjectId FROM idempotency_keys WHERE Key=?;", (key,)).fetchone()
+        if row:
+            conn.execute("COMMIT;")
+            return row[0], False
+        cur = conn.execute(
+            "INSERT INTO projects (Title, Description, ImageFileName) VALUES (?,?,?)",
+            (title, description, image_filename or ""),
+        )
+        project_id = cur.lastrowid
+        conn.execute("INSERT INTO idempotency_keys (Key, ProjectId) VALUES (?,?);", (key, project_id))
+        conn.execute("COMMIT;")
+    _notify_change('save', project_id)
+    return project_id, True
 
 
+@_timed
+def purge_idempotency_keys(max_age_seconds: float) -> int:
+    """Delete idempotency keys older than ``max_age_seconds`` and return how many were removed."""
+    with _connection() as conn:
+        cur = conn.execute(
+            "DELETE FROM idempotency_keys WHERE CreatedAt < datetime('now', ?);",
+            (f"-{int(max_age_seconds)} seconds",),
+        )
+        return cur.rowcount
+
+
+# Columns of every project SELECT, in order; rows are built straight into dicts
+PROJECT_COLUMNS = ('id', 'Title', 'Description', 'ImageFileName', 'CreatedAt')
+
+
+def _project_row(cursor: sqlite3.Cursor, row: tuple) -> Dict:
+    return dict(zip(PROJECT_COLUMNS, row))
+
+
+@_timed
 def get_all_projects() -> List[Dict]:
     """Return a list of projects as dictionaries."""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT id, Title, Description, ImageFileName, CreatedAt FROM projects ORDER BY id DESC;")
-        rows = cur.fetchall()
-        projects = []
-        for r in rows:
-            projects.append(
-                {
-                    "id": r["id"],
-                    "Title": r["Title"],
-                    "Description": r["Description"],
-                    "ImageFileName": r["ImageFileName"],
-                    "CreatedAt": r["CreatedAt"],
-                }
-            )
-        return projects
-    finally:
-        conn.close()
+    with _connection() as conn:
+        conn.row_factory = _project_row
+        return conn.execute(
+            "SELECT id, Title, Description, ImageFileName, CreatedAt FROM projects "
+            "WHERE DeletedAt IS NULL ORDER BY id DESC;"
+        ).fetchall()
+
+
+def iter_projects(batch_size: int = 500) -> Iterator[Dict]:
+    """Yield every project as a dictionary, newest first, reading ``batch_size`` rows at a time.
+
+    Unlike ``get_all_projects`` only one batch is in memory at once, so
+    exports and scans over large tables use constant memory. The pooled
+    connection is held until the generator is exhausted or closed.
+    """
+    with _connection() as conn:
+        conn.row_factory = _project_row
+        cur = conn.execute(
+            "SELECT id, Title, Description, ImageFileName, CreatedAt FROM projects "
+            "WHERE DeletedAt IS NULL ORDER BY id DESC;"
+        )
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+
+# Whitelisted listing orders. Each one is served straight from a live-rows
+# index (migrations 5/6), so listings skip tombstones without a separate sort
+# step. Once ANALYZE has seen that there are no tombstones, SQLite may prefer
+# the equivalent rowid scan for 'newest'.
+SORT_ORDERS = {
+    'newest': 'id DESC',
+    'created': 'CreatedAt DESC, id DESC',
+    'title': 'Title COLLATE NOCASE ASC, id ASC',
+}
+
+
+def build_projects_query(
+    sort: str = 'newest',
+    q: Optional[str] = None,
+    created_from: Optional[datetime.date] = None,
+    created_to: Optional[datetime.date] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> Tuple[str, list]:
+    """Return the SQL and parameters for a filtered, sorted projects listing.
+
+    ``q`` matches titles by case-insensitive prefix (so it can use the Title
+    index); ``created_from``/``created_to`` are inclusive dates. A date range
+    with the default order is listed newest-created first so it can walk the
+    CreatedAt index instead of the whole table.
+    Raises ValueError for an unknown sort order.
+    """
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"Unknown sort order: {sort!r}")
+    if sort == 'newest' and (created_from is not None or created_to is not None):
+        sort = 'created'
+    # Matches the WHERE of the partial indexes, so the planner can use them
+    clauses = ["DeletedAt IS NULL"]
+    params: list = []
+    if q:
+        escaped = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        clauses.append("Title LIKE ? ESCAPE '\\'")
+        params.append(escaped + '%')
+    if created_from is not None:
+        clauses.append("CreatedAt >= ?")
+        params.append(created_from.isoformat())
+    if created_to is not None:
+        clauses.append("CreatedAt < ?")
+        params.append((created_to + datetime.timedelta(days=1)).isoformat())
+
+    sql = "SELECT id, Title, Description, ImageFileName, CreatedAt FROM projects"
+    sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY " + SORT_ORDERS[sort]
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([int(limit), int(offset)])
+    return sql + ";", params
+
+
+@_timed
+def query_projects(**filters) -> List[Dict]:
+    """Return projects matching ``filters`` (see ``build_projects_query``) as dictionaries."""
+    sql, params = build_projects_query(**filters)
+    with _connection() as conn:
+        conn.row_factory = _project_row
+        return conn.execute(sql, params).fetchall()
 
 
+@_timed
+def count_projects() -> int:
+    """Return the number of projects, not counting deleted ones."""
+    with _connection() as conn:
+        return conn.execute("SELECT count(*) FROM projects WHERE DeletedAt IS NULL;").fetchone()[0]
+
+
+@_timed
+def get_projects_fingerprint() -> str:
+    """Return a cheap token that changes whenever projects are added, deleted or restored."""
+    with _connection() as conn:
+        row = conn.execute(
+            "SELECT count(*), coalesce(max(id), 0), coalesce(sum(id), 0) FROM projects WHERE DeletedAt IS NULL;"
+        ).fetchone()
+        return "%d-%d-%d" % row
+
+
+@_timed
 def get_project_by_id(project_id: int) -> Optional[Dict]:
     """Return a single project dict by id, or None if not found."""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT id, Title, Description, ImageFileName, CreatedAt FROM projects WHERE id=?;", (project_id,))
-        row = cur.fetchone()
-        if not row:
-            return None
-        return {
-            "id": row["id"],
-            "Title": row["Title"],
-            "Description": row["Description"],
-            "ImageFileName": row["ImageFileName"],
-            "CreatedAt": row["CreatedAt"],
-        }
-    finally:
-        conn.close()
+    with _connection() as conn:
+        conn.row_factory = _project_row
+        return conn.execute(
+            "SELECT id, Title, Description, ImageFileName, CreatedAt FROM projects WHERE id=? AND DeletedAt IS NULL;",
+            (project_id,),
+        ).fetchone()
+
 
+@_timed
+def get_projects_by_ids(ids: List[int]) -> List[Dict]:
+    """Return the projects with the given ids, in the order asked for, in one query.
 
+    Unknown and deleted ids are skipped and duplicates are returned once. The ids are
+    passed as a single JSON array parameter, so the statement is the same
+    however many ids there are.
+    """
+    wanted = list(dict.fromkeys(int(i) for i in ids))
+    if not wanted:
+        return []
+    with _connection() as conn:
+        conn.row_factory = _project_row
+        return conn.execute(
+            """
+            SELECT p.id, p.Title, p.Description, p.ImageFileName, p.CreatedAt
+            FROM json_each(?) AS j
+            JOIN projects AS p ON p.id = j.value
+            WHERE p.DeletedAt IS NULL
+            ORDER BY j.key;
+            """,
+            (json.dumps(wanted),),
+        ).fetchall()
+
+
+@_timed
+def get_project_ids() -> List[int]:
+    """Return every project id, newest first."""
+    with _connection() as conn:
+        return [row[0] for row in conn.execute("SELECT id FROM projects WHERE DeletedAt IS NULL ORDER BY id DESC;")]
+
+
+@_timed
 def delete_project(project_id: int) -> None:
-    """Delete a project by id."""
-    db_path = get_db_path()
-    conn = sqlite3.connect(db_path)
-    try:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM projects WHERE id=?;", (project_id,))
-        conn.commit()
-    finally:
-        conn.close()
+    """Delete a project by id.
+
+    The row is only marked deleted (a tombstone) so the request pays for a
+    one-row UPDATE; ``purge_deleted`` removes it later, and until then
+    ``restore_project`` can bring it back.
+    """
+    with _connection() as conn:
+        cur = conn.execute(
+            "UPDATE projects SET DeletedAt = CURRENT_TIMESTAMP WHERE id=? AND DeletedAt IS NULL;", (project_id,)
+        )
+        deleted = cur.rowcount > 0
+    if deleted:
+        _notify_change('delete', project_id)
+
+
+@_timed
+def delete_projects(ids: List[int]) -> int:
+    """Delete the projects with the given ids in one statement and return how many were deleted."""
+    wanted = list(dict.fromkeys(int(i) for i in ids))
+    if not wanted:
+        return 0
+    with _connection() as conn:
+        deleted = [row[0] for row in conn.execute(
+            """
+            UPDATE projects SET DeletedAt = CURRENT_TIMESTAMP
+            WHERE id IN (SELECT value FROM json_each(?)) AND DeletedAt IS NULL
+            RETURNING id;
+            """,
+            (json.dumps(wanted),),
+        ).fetchall()]
+    for project_id in deleted:
+        _notify_change('delete', project_id)
+    return len(deleted)
+
+
+@_timed
+def restore_project(project_id: int) -> bool:
+    """Undo the deletion of a project that has not been purged yet; return True if it was restored."""
+    with _connection() as conn:
+        cur = conn.execute(
+            "UPDATE projects SET DeletedAt = NULL WHERE id=? AND DeletedAt IS NOT NULL;", (project_id,)
+        )
+        restored = cur.rowcount > 0
+    if restored:
+        _notify_change('restore', project_id)
+    return restored
+
+
+@_timed
+def purge_deleted(older_than_seconds: float = 0, batch_size: int = 100, pause: float = 0.0,
+                  should_stop: Optional[Callable[[], bool]] = None) -> int:
+    """Permanently remove projects deleted more than ``older_than_seconds`` ago; return how many.
+
+    Rows go ``batch_size`` at a time, each batch in its own short write
+    transaction, sleeping ``pause`` seconds between batches so requests can
+    take the write lock. ``should_stop`` is checked before every batch (e.g.
+    to back off when traffic picks up); the rest is left for the next run.
+    """
+    purged = 0
+    while should_stop is None or not should_stop():
+        with _connection() as conn:
+            cur = conn.execute(
+                """
+                DELETE FROM projects WHERE id IN (
+                    SELECT id FROM projects
+                    WHERE DeletedAt IS NOT NULL AND DeletedAt <= datetime('now', ?)
+                    LIMIT ?
+                );
+                """,
+                (f"-{int(older_than_seconds)} seconds", int(batch_size)),
+            )
+            purged += cur.rowcount
+        if cur.rowcount < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return purged
+
+
+def _main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage the projects database.")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("list", help="initialize the DB and print every project (default)")
+    sub.add_parser("status", help="show the current and latest schema version")
+    migrate_parser = sub.add_parser("migrate", help="apply pending schema migrations")
+    migrate_parser.add_argument("--to", type=int, default=None, help="stop at this schema version")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        current = get_schema_version()
+        print(f"Database: {get_db_path()}")
+        print(f"Schema version: {current} (latest {SCHEMA_VERSION})")
+        for version, description, _ in MIGRATIONS:
+            state = "applied" if version <= current else "pending"
+            print(f"  {version:>3}  {state:<8} {description}")
+    elif args.command == "migrate":
+        applied = migrate(args.to)
+        print(f"Applied migrations: {applied or 'none'}; schema version is now {get_schema_version()}")
+    else:
+        # Quick CLI helper used for manual testing
+        init_db()
+        print(f"Initialized DB at: {get_db_path()}")
+        print("Existing projects:")
+        for p in iter_projects():
+            print(p)
 
 
 if __name__ == "__main__":
-    # Quick CLI helper used for manual testing
-    init_db()
-    print(f"Initialized DB at: {get_db_path()}")
-    print("Existing projects:")
-    for p in get_all_projects():
-        print(p)
+    _main()
@@ -0,0 +1,209 @@
+"""Structured JSON access log, written off the request path by a batching background thread."""
+import atexit
+import datetime
+import json
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from flask import g, has_request_context, request
+
+import DAL
+import metrics
+
+
+metrics.registry.describe('log_queue_depth', 'gauge', 'Records waiting to be written per background writer')
+metrics.registry.describe('log_records_dropped_total', 'counter', 'Records dropped because the writer queue was full')
+metrics.registry.describe('log_batches_written_total', 'counter', 'Batches handed to each writer by outcome')
+
+_STOP = object()
+
+
+class BatchWriter:
+    """Hand records to ``write_batch`` in batches on a background thread.
+
+    ``submit`` only puts the record on a bounded queue. When the queue is full
+    the ``policy`` decides: ``'drop'`` discards the record (and counts it),
+    ``'block'`` waits up to ``block_timeout`` seconds for room before dropping.
+    A batch is written once ``batch_size`` records are queued or
+    ``flush_interval`` seconds after its first record, whichever comes first.
+    """
+
+    def __init__(self, name: str, write_batch: Callable[[List], None], max_queue: int = 10000,
+                 batch_size: int = 256, flush_interval: float = 1.0, policy: str = 'drop',
+                 block_timeout: float = 1.0):
+        if policy not in ('drop', 'block'):
+            raise ValueError(f"Unknown queue-full policy: {policy!r}")
+        self.name = name
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        metrics.registry.register_collector(self._collect)
+
+    def _collect(self, registry: metrics.Metrics) -> None:
+        registry.set('log_queue_depth', self._queue.qsize(), writer=self.name)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, record) -> bool:
+        """Queue ``record``; return False if it was dropped."""
+        if self._thread is None:
+            self.start()
+        try:
+            if self.policy == 'block':
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            metrics.registry.inc('log_records_dropped_total', writer=self.name)
+            return False
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            batch = [] if first is _STOP else [first]
+            stop = first is _STOP
+            deadline = time.monotonic() + self.flush_interval
+            while not stop and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                try:
+                    self.write_batch(batch)
+                    metrics.registry.inc('log_batches_written_total', writer=self.name, status='ok')
+                except Exception:
+                    # Losing a batch beats killing the writer thread
+                    metrics.registry.inc('log_batches_written_total', writer=self.name, status='error')
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self) -> None:
+        """Block until everything queued so far has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Write what is queued and stop the thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+
+def stream_writer(stream) -> Callable[[List[str]], None]:
+    """Write each batch of lines to ``stream`` with a single write and flush."""
+    def write(lines: List[str]) -> None:
+        stream.write(''.join(line + '\n' for line in lines))
+        stream.flush()
+    return write
+
+
+def file_writer(path: str) -> Callable[[List[str]], None]:
+    """Append each batch of lines to the file at ``path``."""
+    def write(lines: List[str]) -> None:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line in lines))
+    return write
+
+
+class AccessLog:
+    """One JSON line per request: route, status, latency, DB time, cache status, bytes out.
+
+    Records are built on the request thread (cheap) and serialised and
+    written by a ``BatchWriter`` thread.
+    """
+
+    def __init__(self, writer: BatchWriter):
+        self.writer = writer
+
+    def init_app(self, app) -> None:
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        DAL.add_timing_listener(self._record_db_time)
+        app.extensions['access_log'] = self
+
+    @staticmethod
+    def _start() -> None:
+        # g outlives the request when an app context was already pushed
+        g.request_started = time.perf_counter()
+        g.db_seconds = 0.0
+        g.db_calls = 0
+        g.pop('cache_status', None)
+
+    @staticmethod
+    def _record_db_time(operation: str, seconds: float) -> None:
+        if has_request_context() and 'db_seconds' in g:
+            g.db_seconds += seconds
+            g.db_calls += 1
+
+    def _finish(self, response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        # A 304 or HEAD keeps the Content-Length of the body it is not sending
+        sent_body = request.method != 'HEAD' and response.status_code != 304
+        self.writer.submit({
+            'ts': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'status': response.status_code,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 3),
+            'db_ms': round(g.db_seconds * 1000, 3),
+            'db_calls': g.db_calls,
+            'cache': g.get('cache_status'),
+            'bytes': response.content_length if sent_body else 0,
+            'client': request.remote_addr,
+            'trace_id': g.get('trace_id'),
+        })
+        return response
+
+
+def format_records(write_lines: Callable[[List[str]], None]) -> Callable[[List[Dict]], None]:
+    """Serialise records to JSON lines on the writer thread, then pass them on."""
+    def write(records: List[Dict]) -> None:
+        write_lines([json.dumps(r, separators=(',', ':')) for r in records])
+    return write
+
+
+def init_app(app) -> Optional[AccessLog]:
+    """Enable the access log if ``ACCESS_LOG`` is set (``-`` for stdout, else a file path)."""
+    target = app.config.get('ACCESS_LOG')
+    if not target:
+        return None
+    lines = stream_writer(sys.stdout) if target == '-' else file_writer(target)
+    writer = BatchWriter(
+        'access_log', format_records(lines),
+        max_queue=app.config.get('ACCESS_LOG_QUEUE_SIZE', 10000),
+        batch_size=app.config.get('ACCESS_LOG_BATCH_SIZE', 256),
+        flush_interval=app.config.get('ACCESS_LOG_FLUSH_INTERVAL', 1.0),
+        policy=app.config.get('ACCESS_LOG_FULL_POLICY', 'drop'),
+    )
+    atexit.register(writer.close)
+    access_log = AccessLog(writer)
+    access_log.init_app(app)
+    return access_log
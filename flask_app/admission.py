@@ -0,0 +1,192 @@
+"""Admission control: per-route concurrency limits and per-client rate limits."""
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import request
+
+import metrics
+
+
+metrics.registry.describe('admission_in_flight', 'gauge', 'Requests currently being served per limited route')
+metrics.registry.describe('admission_queued', 'gauge', 'Requests waiting for a slot per limited route')
+metrics.registry.describe('admission_rejected_total', 'counter', 'Requests shed per route and reason')
+
+
+class Rejected(Exception):
+    """Raised when a request is shed; rendered as a fast error with Retry-After."""
+
+    def __init__(self, status: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class ConcurrencyLimiter:
+    """Allow ``max_concurrent`` requests at once and queue up to ``max_queue`` more.
+
+    A queued request waits at most ``queue_timeout`` seconds. Requests that
+    could not get a slot within that deadline -- judged from the queue length
+    and recent service times -- are rejected immediately instead of waiting
+    and timing out anyway.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._service_time = 0.05  # EWMA of seconds per request, seeded low
+        self._cond = threading.Condition()
+
+    def _expected_wait(self) -> float:
+        return (self.waiting + 1) * self._service_time / max(1, self.max_concurrent)
+
+    def _reject(self, reason: str) -> Rejected:
+        metrics.registry.inc('admission_rejected_total', route=self.name, reason=reason)
+        return Rejected(503, max(1, math.ceil(self._expected_wait())), reason)
+
+    def acquire(self) -> None:
+        with self._cond:
+            if self.active < self.max_concurrent:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise self._reject('queue_full')
+            if self._expected_wait() > self.queue_timeout:
+                raise self._reject('deadline')
+            self.waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject('timeout')
+                    self._cond.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        with self._cond:
+            self.active -= 1
+            if service_time is not None:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+
+class RateLimiter:
+    """Token bucket per client: ``rate`` tokens per second, bursts up to ``burst``.
+
+    Only the ``max_clients`` most recently seen clients are tracked, so memory
+    stays bounded however many addresses show up.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_clients: int = 10000):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client: str) -> float:
+        """Take a token for ``client``; return 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate if self.rate > 0 else float('inf')
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+def client_address() -> str:
+    # With ProxyFix configured (PROXY_COUNT) this is the real client, not nginx
+    return request.remote_addr or 'unknown'
+
+
+class AdmissionControl:
+    """Registry of limiters plus the Flask glue that applies them to views."""
+
+    def __init__(self):
+        self.limiters: Dict[str, ConcurrencyLimiter] = {}
+        self.rate_limiters: Dict[str, RateLimiter] = {}
+
+    def init_app(self, app) -> None:
+        app.extensions['admission'] = self
+        app.register_error_handler(Rejected, self._rejected_response)
+        metrics.registry.register_collector(self._collect)
+
+    @staticmethod
+    def _rejected_response(exc: Rejected):
+        body = 'Too many requests' if exc.status == 429 else 'Service temporarily overloaded'
+        return body, exc.status, {'Retry-After': str(int(exc.retry_after)), 'Cache-Control': 'no-store'}
+
+    def _collect(self, registry: metrics.Metrics) -> None:
+        for name, limiter in self.limiters.items():
+            registry.set('admission_in_flight', limiter.active, route=name)
+            registry.set('admission_queued', limiter.waiting, route=name)
+
+    def limit(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float) -> Callable:
+        """Decorator: run the view under a ConcurrencyLimiter called ``name``."""
+        limiter = self.limiters[name] = ConcurrencyLimiter(name, max_concurrent, max_queue, queue_timeout)
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                with limiter.slot():
+                    return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def rate_limit(self, name: str, rate: float, burst: int, methods=('POST',)) -> Callable:
+        """Decorator: apply a per-client token bucket to ``methods`` of the view."""
+        limiter = self.rate_limiters[name] = RateLimiter(name, rate, burst)
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method in methods:
+                    wait = limiter.check(client_address())
+                    if wait > 0:
+                        metrics.registry.inc('admission_rejected_total', route=name, reason='rate_limited')
+                        raise Rejected(429, max(1, math.ceil(min(wait, 3600))), 'rate_limited')
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def in_flight(self) -> int:
+        """Requests running or queued on the limited routes right now."""
+        return sum(limiter.active + limiter.waiting for limiter in self.limiters.values())
+
+    def reset(self) -> None:
+        """Forget all per-client rate limit state."""
+        for limiter in self.rate_limiters.values():
+            limiter.reset()
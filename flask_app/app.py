@@ -1,71 +1,447 @@
-from flask import Flask, render_template, request, redirect, url_for
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, render_template, request, redirect, url_for, abort, Response, g, jsonify
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.serving import WSGIRequestHandler
 import DAL
+import accesslog
+import admission
+import cache
+import cssbuild
+import datetime
+import logging
 import os
+import uuid
+import fragments
+import freeze
+import hints
+import maintenance
+import memprofile
+import metrics
+import offload
+import sharedcache
+import startup
+import tenants
+import tracing
+
+startup_timer = startup.StartupTimer(started=_import_started)
+startup_timer.mark('imports')
 
 app = Flask(__name__)
+app.config.update(
+    # 'lazy' sets up the DB on the first request; 'warm' precompiles templates
+    # and sets up the DB in parallel before the server starts accepting.
+    STARTUP_MODE=os.environ.get('STARTUP_MODE', 'lazy'),
+    # Database used while handling requests (None: DAL's default location)
+    PROJECTS_DB_PATH=os.environ.get('PROJECTS_DB_PATH'),
+    TEMPLATE_CACHE_DIR=os.environ.get('TEMPLATE_CACHE_DIR', startup.DEFAULT_TEMPLATE_CACHE_DIR),
+    # Output of cssbuild.py; pages fall back to the plain stylesheet until it exists
+    CSS_BUILD_DIR=os.environ.get('CSS_BUILD_DIR', cssbuild.BUILD_DIR),
+    PROJECTS_PAGE_SIZE=int(os.environ.get('PROJECTS_PAGE_SIZE', 50)),
+    # Most-viewed project detail rows kept in memory; only this process evicts
+    # a deleted project at once, so the TTL bounds how long other workers serve it
+    PROJECT_CACHE_SIZE=int(os.environ.get('PROJECT_CACHE_SIZE', 256)),
+    PROJECT_CACHE_TTL=float(os.environ.get('PROJECT_CACHE_TTL', 60)),
+    # Listing query/page cache: writes in this process invalidate it at once;
+    # the TTL bounds staleness from writes made by other processes, and expired
+    # entries are served for up to PROJECTS_CACHE_STALE seconds while one
+    # request refreshes them. A TTL of 0 disables caching.
+    PROJECTS_CACHE_TTL=float(os.environ.get('PROJECTS_CACHE_TTL', 5)),
+    PROJECTS_CACHE_STALE=float(os.environ.get('PROJECTS_CACHE_STALE', 30)),
+    # Admission control for the DB-backed routes: concurrent requests, queued
+    # requests and the longest a request may wait in the queue (seconds)
+    DB_ROUTE_MAX_CONCURRENCY=int(os.environ.get('DB_ROUTE_MAX_CONCURRENCY', 16)),
+    DB_ROUTE_MAX_QUEUE=int(os.environ.get('DB_ROUTE_MAX_QUEUE', 32)),
+    DB_ROUTE_QUEUE_TIMEOUT=float(os.environ.get('DB_ROUTE_QUEUE_TIMEOUT', 2)),
+    # Project submissions per client IP: sustained rate per second and burst
+    SUBMIT_RATE=float(os.environ.get('SUBMIT_RATE', 0.2)),
+    SUBMIT_BURST=int(os.environ.get('SUBMIT_BURST', 10)),
+    # Number of reverse proxies in front of the app (1 behind nginx) whose
+    # X-Forwarded-* headers are trusted for the client address
+    PROXY_COUNT=int(os.environ.get('PROXY_COUNT', 0)),
+    # Background DB upkeep; intervals are in seconds
+    DB_MAINTENANCE=os.environ.get('DB_MAINTENANCE', '0') == '1',
+    MAINTENANCE_CHECKPOINT_INTERVAL=float(os.environ.get('MAINTENANCE_CHECKPOINT_INTERVAL', 300)),
+    MAINTENANCE_ANALYZE_INTERVAL=float(os.environ.get('MAINTENANCE_ANALYZE_INTERVAL', 3600)),
+    MAINTENANCE_VACUUM_INTERVAL=float(os.environ.get('MAINTENANCE_VACUUM_INTERVAL', 3600)),
+    BACKUP_DIR=os.environ.get('BACKUP_DIR'),
+    BACKUP_INTERVAL=float(os.environ.get('BACKUP_INTERVAL', 86400)),
+    BACKUP_KEEP=int(os.environ.get('BACKUP_KEEP', 7)),
+    # How long a submission's idempotency key is remembered (seconds)
+    IDEMPOTENCY_KEY_TTL=float(os.environ.get('IDEMPOTENCY_KEY_TTL', 86400)),
+    MAINTENANCE_PURGE_INTERVAL=float(os.environ.get('MAINTENANCE_PURGE_INTERVAL', 3600)),
+    # Deleted projects stay restorable this long (seconds), then are purged
+    # PURGE_BATCH_SIZE rows at a time while no DB-backed request is running
+    PURGE_DELETED_AFTER=float(os.environ.get('PURGE_DELETED_AFTER', 86400)),
+    PURGE_BATCH_SIZE=int(os.environ.get('PURGE_BATCH_SIZE', 100)),
+    # When set, the site is exported here and listing pages re-exported after writes
+    FREEZE_DIR=os.environ.get('FREEZE_DIR'),
+    # Set (e.g. to /_accel) behind nginx so static files and downloads are
+    # sent by nginx via X-Accel-Redirect instead of streamed through Python
+    ACCEL_REDIRECT_PREFIX=os.environ.get('ACCEL_REDIRECT_PREFIX', ''),
+    # JSON access log: '-' for stdout or a file path; empty disables it
+    ACCESS_LOG=os.environ.get('ACCESS_LOG', ''),
+    ACCESS_LOG_QUEUE_SIZE=int(os.environ.get('ACCESS_LOG_QUEUE_SIZE', 10000)),
+    ACCESS_LOG_BATCH_SIZE=int(os.environ.get('ACCESS_LOG_BATCH_SIZE', 256)),
+    ACCESS_LOG_FLUSH_INTERVAL=float(os.environ.get('ACCESS_LOG_FLUSH_INTERVAL', 1.0)),
+    # 'drop' never delays a request; 'block' waits briefly for room instead
+    ACCESS_LOG_FULL_POLICY=os.environ.get('ACCESS_LOG_FULL_POLICY', 'drop'),
+    # Tracing: spans go to TRACE_OTLP_ENDPOINT (OTLP/HTTP JSON) or TRACE_FILE
+    TRACE_OTLP_ENDPOINT=os.environ.get('TRACE_OTLP_ENDPOINT', ''),
+    TRACE_FILE=os.environ.get('TRACE_FILE', ''),
+    TRACE_SAMPLE_RATE=float(os.environ.get('TRACE_SAMPLE_RATE', 0.01)),
+    # Requests at least this slow are exported even when not sampled (0 = off)
+    TRACE_SLOW_MS=float(os.environ.get('TRACE_SLOW_MS', 0)),
+    # Callers (comma-separated addresses/networks) whose traceparent sampled
+    # flag is honoured; anyone else is sampled at TRACE_SAMPLE_RATE
+    TRACE_TRUSTED_UPSTREAMS=os.environ.get('TRACE_TRUSTED_UPSTREAMS', ''),
+    # Multi-portfolio hosting: 'host' (alice.<TENANT_HOST_SUFFIX>) or 'path'
+    # (/t/alice/...) picks a tenant whose projects live in TENANT_DIR/<name>.db;
+    # TENANTS optionally lists the only names allowed (comma separated)
+    TENANT_MODE=os.environ.get('TENANT_MODE', ''),
+    TENANT_HOST_SUFFIX=os.environ.get('TENANT_HOST_SUFFIX', ''),
+    TENANT_DIR=os.environ.get('TENANT_DIR', tenants.DEFAULT_TENANT_DIR),
+    TENANTS=os.environ.get('TENANTS', ''),
+    # Diagnosis mode: track allocations with tracemalloc, serve /debug/memory
+    # and per-route peak memory gauges. Serialises requests; keep it off in production.
+    MEMORY_PROFILE=os.environ.get('MEMORY_PROFILE', '0') == '1',
+    MEMORY_PROFILE_FRAMES=int(os.environ.get('MEMORY_PROFILE_FRAMES', 1)),
+    MEMORY_PROFILE_TOP=int(os.environ.get('MEMORY_PROFILE_TOP', 10)),
+    # Rendered pages shared by all workers on the host through this SQLite
+    # file (e.g. /tmp/flask-portfolio-pages.db); empty keeps caches per worker
+    SHARED_CACHE_PATH=os.environ.get('SHARED_CACHE_PATH', ''),
+    SHARED_CACHE_MAX_ENTRIES=int(os.environ.get('SHARED_CACHE_MAX_ENTRIES', 2000)),
+    FILES_DIR=os.environ.get(
+        'FILES_DIR', os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files'))),
+)
+# Inside ProxyFix, so host routing sees the forwarded Host header
+tenants.init_app(app)
+if app.config['PROXY_COUNT']:
+    n = app.config['PROXY_COUNT']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=n, x_proto=n, x_host=n)
+startup.configure_bytecode_cache(app, app.config['TEMPLATE_CACHE_DIR'])
+app.jinja_env.trim_blocks = True
+fragment_cache = fragments.init_app(app)
+# Registered first so its after_request hook runs last and sees the final response
+access_log = accesslog.init_app(app)
+tracer = tracing.init_app(app)
+memory_profiler = memprofile.init_app(app)
+css_assets = cssbuild.init_app(app)
+preload_hints = hints.PreloadHints(app)
+offload.init_app(app)
+
+# Ensure DB/table exist. Setup is deferred so importing the app (and every
+# worker that scales out) doesn't pay for it before it can serve a request.
+db_setup = startup.DeferredInit(DAL.init_db, timer=startup_timer)
+
+
+@app.before_request
+def bind_db():
+    tenant = request.environ.get(tenants.ENVIRON_KEY)
+    if tenant:
+        g.db_path_token = DAL.db_path_override.set(tenants.shard_path(app.config['TENANT_DIR'], tenant))
+    elif app.config['PROJECTS_DB_PATH']:
+        g.db_path_token = DAL.db_path_override.set(app.config['PROJECTS_DB_PATH'])
+
+
+@app.teardown_request
+def unbind_db(exc):
+    token = g.pop('db_path_token', None)
+    if token is not None:
+        DAL.db_path_override.reset(token)
+
+
+@app.before_request
+def ensure_db():
+    if request.environ.get(tenants.ENVIRON_KEY):
+        # Shards are only created by `tenants.py create`, never by a request
+        if not os.path.exists(DAL.get_db_path()):
+            abort(404)
+        # Existing shards are migrated on their first request in this process
+        DAL.ensure_db()
+    else:
+        db_setup.ensure()
+
+
+@app.cli.command('warm')
+def warm_command():
+    """Precompile templates and initialize the DB, then print the timings."""
+    startup.warm_up(app, db_setup, startup_timer)
+    print(startup_timer.format())
+
+
+metrics.registry.register_collector(maintenance.collect_db_metrics)
+
+# Only the DB-backed routes are limited, so static pages stay responsive
+# while these are saturated
+admission_control = admission.AdmissionControl()
+admission_control.init_app(app)
+
+
+def _db_route_limit(name):
+    return admission_control.limit(
+        name,
+        app.config['DB_ROUTE_MAX_CONCURRENCY'],
+        app.config['DB_ROUTE_MAX_QUEUE'],
+        app.config['DB_ROUTE_QUEUE_TIMEOUT'],
+    )
+
+
+# Hot-object cache for /projects/<id>, keyed by (database, id)
+project_cache = cache.LRUCache(app.config['PROJECT_CACHE_SIZE'], app.config['PROJECT_CACHE_TTL'])
+
+
+def _evict_deleted_project(event, project_id):
+    if event == 'delete':
+        project_cache.pop((DAL.get_db_path(), project_id))
+
+
+DAL.add_change_listener(_evict_deleted_project)
+
+
+def get_projects_cached(ids):
+    """Return projects by id from the hot-object cache, fetching all misses in one query."""
+    db_path = DAL.get_db_path()
+    found = {}
+    missing = []
+    for project_id in ids:
+        project = project_cache.get((db_path, project_id))
+        if project is None:
+            missing.append(project_id)
+        else:
+            found[project_id] = project
+    metrics.registry.inc('project_cache_requests_total', len(found), result='hit')
+    metrics.registry.inc('project_cache_requests_total', len(missing), result='miss')
+    if missing:
+        for project in DAL.get_projects_by_ids(missing):
+            project_cache.set((db_path, project['id']), project)
+            found[project['id']] = project
+    return [found[i] for i in ids if i in found]
+
+
+# Listing caches: DAL query results and rendered /projects pages
+listing_cache = cache.RefreshingCache(app.config['PROJECTS_CACHE_TTL'], app.config['PROJECTS_CACHE_STALE'])
+page_cache = cache.RefreshingCache(app.config['PROJECTS_CACHE_TTL'], app.config['PROJECTS_CACHE_STALE'])
+
+
+# Host-wide tier under page_cache; DAL writes in any worker bump its generation
+shared_pages = sharedcache.init_app(app)
+
+
+def shared_page(scope, key, render):
+    """Return ``render()``'s page through the shared cache tier, if it is on."""
+    if shared_pages is None:
+        return render()
+    key = f"{sharedcache.templates_version(app)}|{request.script_root}|{key}"
+    body, status = shared_pages.get_or_render(key, scope, lambda: render().encode())
+    metrics.registry.inc('cache_requests_total', cache='shared_pages', status=status)
+    g.shared_cache_status = status
+    return body
+
+
+def render_static_page(template):
+    """Render a page that does not depend on the database, once per host."""
+    g.pop('shared_cache_status', None)
+    body = shared_page('static', template, lambda: render_template(template))
+    if 'shared_cache_status' in g:
+        g.cache_status = 'shared_' + g.shared_cache_status
+    return body
+
+
+def invalidate_listing_caches(event=None, project_id=None):
+    listing_cache.invalidate()
+    page_cache.invalidate()
 
-# Ensure DB/table exist. Use before_first_request if available; otherwise
-# call init directly (some older Flask versions/environment proxies may not
-# expose the decorator at import-time in this environment).
-if hasattr(app, 'before_first_request'):
-    @app.before_first_request
-    def ensure_db():
-        DAL.init_db()
-else:
-    # Fallback: initialize now
-    DAL.init_db()
+
+DAL.add_change_listener(invalidate_listing_caches)
+
+
+def _shared_generation(db_path):
+    """Key suffix that changes when any worker writes to ``db_path`` (empty without the shared tier)."""
+    if shared_pages is None:
+        return ()
+    return (shared_pages.generation(db_path),)
+
+
+def query_projects_cached(**query):
+    """DAL.query_projects, with concurrent identical queries sharing one execution."""
+    db_path = DAL.get_db_path()
+    # Rows cached before another worker's write must not be rendered into a newer page
+    key = (db_path,) + tuple(sorted(query.items())) + _shared_generation(db_path)
+    rows, status = listing_cache.get(key, lambda: DAL.query_projects(**query))
+    metrics.registry.inc('cache_requests_total', cache='listing_query', status=status)
+    return rows
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/debug/memory')
+def debug_memory():
+    """Allocation report from the memory profiler (404 unless MEMORY_PROFILE is on)."""
+    profiler = app.extensions.get('memory_profiler')
+    if profiler is None:
+        abort(404)
+    return jsonify(profiler.report(request.args.get('top', type=int)))
+
+
+startup_timer.mark('app_created')
 
 
 @app.route('/')
 @app.route('/index')
 def index():
-    return render_template('index.html')
+    return render_static_page('index.html')
 
 
 @app.route('/about')
 def about():
-    return render_template('about.html')
+    return render_static_page('about.html')
 
 
 @app.route('/contact')
 def contact():
-    return render_template('contact.html')
+    return render_static_page('contact.html')
+
+
+SQLITE_MAX_INT = 2 ** 63 - 1
+
+
+def _listing_filters(args) -> dict:
+    """Translate ?sort=, ?q=, ?from= and ?to= into query_projects filters.
+
+    Raises ValueError for an unknown sort order or a malformed date.
+    """
+    filters = {'sort': args.get('sort', 'newest')}
+    if filters['sort'] not in DAL.SORT_ORDERS:
+        raise ValueError(f"Unknown sort order: {filters['sort']!r}")
+    q = args.get('q', '').strip()
+    if q:
+        filters['q'] = q
+    for arg, key in (('from', 'created_from'), ('to', 'created_to')):
+        value = args.get(arg, '').strip()
+        if value:
+            filters[key] = datetime.date.fromisoformat(value)
+    return filters
+
+
+@app.route('/projects', defaults={'page': 1})
+@app.route('/projects/page/<int:page>')
+@_db_route_limit('projects')
+def projects(page):
+    try:
+        filters = _listing_filters(request.args)
+    except ValueError:
+        abort(400)
+    page_size = app.config['PROJECTS_PAGE_SIZE']
+    # Past SQLite's 64-bit OFFSET the query would raise OverflowError; no such page exists anyway
+    if page < 1 or page * page_size > SQLITE_MAX_INT:
+        abort(404)
 
+    db_path = DAL.get_db_path()
+    # A write in another worker changes the key, so this worker's copy is dropped too
+    key = (db_path, page_size, request.full_path) + _shared_generation(db_path)
+    g.pop('shared_cache_status', None)
+    html, status = page_cache.get(key, lambda: shared_page(
+        db_path, f'{page_size}|{request.full_path}', lambda: _render_projects_page(page, page_size, filters)))
+    if status in ('miss', 'refreshed') and g.get('shared_cache_status') in ('hit', 'coalesced'):
+        status = 'shared_' + g.shared_cache_status
+    g.cache_status = status
+    metrics.registry.inc('cache_requests_total', cache='projects_page', status=status)
+    return html
 
-@app.route('/projects')
-def projects():
-    # Read projects from the database and pass to the template
-    projects = DAL.get_all_projects()
-    return render_template('projects.html', projects=projects)
+
+def _render_projects_page(page, page_size, filters):
+    # Read one extra row to learn whether there is a next page without a COUNT(*)
+    rows = query_projects_cached(limit=page_size + 1, offset=(page - 1) * page_size, **filters)
+    if page > 1 and not rows:
+        abort(404)
+    return render_template(
+        'projects.html',
+        projects=rows[:page_size],
+        page=page,
+        has_next=len(rows) > page_size,
+        pager_args=_pager_args(request.args),
+    )
+
+
+def _pager_args(args) -> dict:
+    """Query args to carry over to the pager links.
+
+    ``page`` is set by the link itself and ``_``-prefixed names are
+    url_for's own options (``_external``, ``_anchor``...), so neither is
+    passed through.
+    """
+    return {key: value for key, value in args.items() if key != 'page' and not key.startswith('_')}
+
+
+@app.route('/projects/<int:project_id>')
+@_db_route_limit('project_detail')
+def project_detail(project_id):
+    projects = get_projects_cached([project_id])
+    if not projects:
+        abort(404)
+    return render_project_detail(projects[0])
+
+
+def render_project_detail(project):
+    return render_template('project_detail.html', project=project)
+
+
+# The static export renders detail pages from its own DAL reads, bypassing project_cache
+app.extensions['render_project_detail'] = render_project_detail
 
 
 @app.route('/projects/add', methods=['GET', 'POST'])
+@admission_control.rate_limit('add_project', app.config['SUBMIT_RATE'], app.config['SUBMIT_BURST'])
+@_db_route_limit('add_project')
 def add_project():
     if request.method == 'POST':
         title = request.form.get('title', '').strip()
         description = request.form.get('description', '').strip()
         image = request.form.get('image', '').strip()
+        # Embedded in the form (or sent by API clients as a header) so that a
+        # double-click or proxy retry replays the first result instead of
+        # creating a duplicate row
+        idempotency_key = (request.headers.get('Idempotency-Key') or request.form.get('idempotency_key', '')).strip()
+        if len(idempotency_key) > 128:
+            abort(400)
 
         # Basic server-side validation
         if title:
-            DAL.save_project(title, description, image)
-            return redirect(url_for('projects'))
+            if not idempotency_key:
+                DAL.save_project(title, description, image)
+                return redirect(url_for('projects'))
+            _project_id, created = DAL.save_project_once(idempotency_key, title, description, image)
+            response = redirect(url_for('projects'))
+            if not created:
+                response.headers['Idempotent-Replayed'] = 'true'
+            return response
         else:
             # If title is missing, re-render form (could add flash messages)
-            return render_template('add_project.html', error='Title is required', title=title, description=description, image=image)
+            return render_template('add_project.html', error='Title is required', title=title, description=description,
+                                   image=image, idempotency_key=idempotency_key or uuid.uuid4().hex)
 
     # GET -> show the add-project form
-    return render_template('add_project.html')
+    return render_template('add_project.html', idempotency_key=uuid.uuid4().hex)
 
 
 @app.route('/resume')
 def resume():
-    return render_template('resume.html')
+    return render_static_page('resume.html')
+
+
+@app.route('/files/<path:filename>')
+def files(filename):
+    return offload.send_file(app.config['FILES_DIR'], filename, 'files')
 
 
 @app.route('/thankyou')
 def thankyou():
-    return render_template('thankyou.html')
+    return render_static_page('thankyou.html')
 
 
 if __name__ == "__main__":
@@ -73,5 +449,24 @@ if __name__ == "__main__":
     host = os.environ.get('FLASK_HOST', '0.0.0.0')
     port = int(os.environ.get('FLASK_PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
-    
+
+    if app.config['STARTUP_MODE'] == 'warm':
+        startup.warm_up(app, db_setup, startup_timer)
+    print(startup_timer.format())
+
+    if app.config['DB_MAINTENANCE']:
+        db_setup.ensure()
+        maintenance.default_scheduler(app.config, is_busy=lambda: admission_control.in_flight() > 0).start()
+
+    if app.config['FREEZE_DIR']:
+        db_setup.ensure()
+        freeze.export(app, app.config['FREEZE_DIR'])
+        freeze.AutoExporter(app, app.config['FREEZE_DIR']).start()
+
+    if access_log is not None:
+        # Werkzeug's own per-request lines are written synchronously; the JSON log replaces them
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    # HTTP/1.1 lets nginx reuse upstream connections (its keepalive pool)
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
     app.run(host=host, port=port, debug=debug)
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""In-process caches shared by the request handlers."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used entry past ``maxsize``.
+
+    With ``ttl`` set, entries also expire that many seconds after they were
+    stored, which bounds how long a change made elsewhere (another worker)
+    can go unseen.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: 'OrderedDict[Hashable, Tuple[Any, Optional[float]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and time.monotonic() >= expires:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+        return entry is not None and (entry[1] is None or time.monotonic() < entry[1])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class _Call:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into a single execution.
+
+    The first caller (the leader) runs the function; callers that arrive while
+    it is running wait for and share its result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return ``(value, shared)``; ``shared`` is True if another caller computed it."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = func()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.value, False
+
+
+class RefreshingCache:
+    """TTL cache with single-flight loading and stale-while-revalidate.
+
+    ``get`` returns ``(value, status)`` where status is one of:
+
+    * ``hit`` -- fresh entry;
+    * ``stale`` -- expired entry served while another caller refreshes it;
+    * ``refreshed`` -- this caller refreshed an expired entry;
+    * ``miss`` -- this caller loaded the value;
+    * ``coalesced`` -- this caller waited for a concurrent load of the same key.
+
+    Entries stay servable for ``stale_ttl`` seconds after they expire.
+    ``invalidate`` drops everything immediately; loads that started before
+    it are returned to their callers but not cached, and later callers
+    start a new load instead of joining them, so a write can never be
+    hidden by a query that raced it.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0.0, maxsize: int = 256):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = LRUCache(maxsize)
+        self._flight = SingleFlight()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _flight_key(self, key: Hashable) -> Tuple[Hashable, int]:
+        with self._lock:
+            return key, self._generation
+
+    def _load(self, key: Hashable, loader: Callable[[], Any]) -> Tuple[Any, bool]:
+        # Loads are shared only within a generation: a caller arriving after
+        # ``invalidate`` must not join a load that may predate the write
+        flight_key = self._flight_key(key)
+        generation = flight_key[1]
+
+        def load():
+            value = loader()
+            now = time.monotonic()
+            with self._lock:
+                if generation == self._generation and self.ttl > 0:
+                    self._entries.set(key, (value, now + self.ttl, now + self.ttl + self.stale_ttl))
+            return value
+
+        return self._flight.do(flight_key, load)
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Tuple[Any, str]:
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                return value, 'hit'
+            if now < stale_until:
+                if self._flight.in_flight(self._flight_key(key)):
+                    return value, 'stale'
+                value, shared = self._load(key, loader)
+                return value, 'coalesced' if shared else 'refreshed'
+        value, shared = self._load(key, loader)
+        return value, 'coalesced' if shared else 'miss'
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
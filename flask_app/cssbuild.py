@@ -0,0 +1,409 @@
+"""Build a minified, pruned styles.css plus per-page critical CSS for inlining."""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Set
+
+from markupsafe import Markup
+from jinja2 import pass_context
+
+import offload
+
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_CSS = os.path.join(APP_DIR, 'static', 'styles.css')
+TEMPLATES_DIR = os.path.join(APP_DIR, 'templates')
+BUILD_DIR = os.path.join(APP_DIR, 'static', 'build')
+MANIFEST_NAME = 'manifest.json'
+# Built files are served under <static url>/build/ wherever CSS_BUILD_DIR is
+BUILD_URL_DIR = 'build'
+STYLESHEET_NAME = 'styles.min.css'
+
+# Elements that are on screen before any template content renders
+ALWAYS_USED = {'*', 'html', 'body'}
+
+# State-dependent pseudo-classes: never needed for first paint
+INTERACTIVE_PSEUDO = re.compile(r':(hover|focus|focus-within|focus-visible|active|visited)\b')
+
+_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_JINJA = re.compile(r'{[{%#].*?[}%#]}', re.S)
+_QUOTED = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+_IDENT = re.compile(r'-?[_a-zA-Z][\w-]*')
+
+
+# -- parsing and serialising -------------------------------------------------
+
+def parse(css: str) -> List[Dict]:
+    """Parse a stylesheet into rules, ``@media``-style blocks and verbatim at-rules.
+
+    Rules are ``{'selectors': [...], 'body': str}``; conditional group rules
+    are ``{'at': prelude, 'rules': [...]}``; anything else (``@keyframes``,
+    ``@font-face``, ``@import``) is kept as ``{'raw': str}``.
+    """
+    css = _COMMENT.sub('', css)
+    rules, _ = _parse_block(css, 0)
+    return rules
+
+
+def _matching_brace(css: str, start: int) -> int:
+    depth = 0
+    for i in range(start, len(css)):
+        if css[i] == '{':
+            depth += 1
+        elif css[i] == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError('Unbalanced braces in stylesheet')
+
+
+def _parse_block(css: str, pos: int):
+    rules = []
+    while pos < len(css):
+        open_brace = css.find('{', pos)
+        close_brace = css.find('}', pos)
+        if close_brace != -1 and (open_brace == -1 or close_brace < open_brace):
+            return rules, close_brace + 1
+        if open_brace == -1:
+            tail = css[pos:].strip()
+            if tail:
+                # Statement at-rules such as @import or @charset
+                rules.extend({'raw': s.strip() + ';'} for s in tail.split(';') if s.strip())
+            break
+        prelude = ' '.join(css[pos:open_brace].split())
+        if prelude.startswith('@') and ';' in prelude:
+            statement, _, prelude = prelude.partition(';')
+            rules.append({'raw': statement.strip() + ';'})
+            prelude = prelude.strip()
+        if prelude.startswith(('@media', '@supports')):
+            children, pos = _parse_block(css, open_brace + 1)
+            rules.append({'at': prelude, 'rules': children})
+        elif prelude.startswith('@'):
+            end = _matching_brace(css, open_brace)
+            rules.append({'raw': prelude + minify_body(css[open_brace:end + 1])})
+            pos = end + 1
+        else:
+            end = css.index('}', open_brace)
+            selectors = [s.strip() for s in prelude.split(',') if s.strip()]
+            rules.append({'selectors': selectors, 'body': css[open_brace + 1:end]})
+            pos = end + 1
+    return rules, pos
+
+
+def _minify_selector(selector: str) -> str:
+    selector = ' '.join(selector.split())
+    return re.sub(r'\s*([>+~])\s*', r'\1', selector)
+
+
+def minify_body(body: str) -> str:
+    """Collapse whitespace inside a declaration block (or a raw at-rule body)."""
+    body = ' '.join(body.split())
+    body = re.sub(r'\s*([{};:,])\s*', r'\1', body)
+    body = re.sub(r';}', '}', body)
+    return body.strip(';')
+
+
+def serialize(rules: Iterable[Dict]) -> str:
+    """Write parsed rules back out as minified CSS."""
+    out = []
+    for rule in rules:
+        if 'raw' in rule:
+            out.append(rule['raw'])
+        elif 'at' in rule:
+            inner = serialize(rule['rules'])
+            if inner:
+                out.append(' '.join(rule['at'].split()).replace(': ', ':') + '{' + inner + '}')
+        else:
+            body = minify_body(rule['body'])
+            if rule['selectors'] and body:
+                out.append(','.join(_minify_selector(s) for s in rule['selectors']) + '{' + body + '}')
+    return ''.join(out)
+
+
+def minify(css: str) -> str:
+    return serialize(parse(css))
+
+
+# -- selector usage ----------------------------------------------------------
+
+def selector_names(selector: str) -> Set[str]:
+    """Return the tags, ``.classes`` and ``#ids`` a selector needs to match anything.
+
+    Pseudo-classes, pseudo-elements and attribute tests are ignored, and
+    combinators are not checked, so the answer errs on the side of keeping.
+    """
+    selector = re.sub(r'\[[^\]]*\]', '', selector)
+    selector = re.sub(r'::?[\w-]+(\([^)]*\))?', '', selector)
+    names = set()
+    for part in re.split(r'[\s>+~]+', selector):
+        for match in re.finditer(r'([.#]?)(-?[_a-zA-Z][\w-]*|\*)', part):
+            prefix, name = match.groups()
+            names.add(prefix + (name if prefix else name.lower()))
+    return names
+
+
+def is_used(selector: str, used: Set[str]) -> bool:
+    return selector_names(selector) <= used | ALWAYS_USED
+
+
+def prune(rules: List[Dict], used: Set[str], drop_interactive: bool = False) -> List[Dict]:
+    """Keep only the selectors whose names all appear in ``used``."""
+    kept = []
+    for rule in rules:
+        if 'raw' in rule:
+            kept.append(rule)
+        elif 'at' in rule:
+            children = prune(rule['rules'], used, drop_interactive)
+            if children:
+                kept.append({'at': rule['at'], 'rules': children})
+        else:
+            selectors = [
+                s for s in rule['selectors']
+                if is_used(s, used) and not (drop_interactive and INTERACTIVE_PSEUDO.search(s))
+            ]
+            if selectors:
+                kept.append({'selectors': selectors, 'body': rule['body']})
+    return kept
+
+
+class _NameCollector(HTMLParser):
+    """Collect tag names, classes, ids and image sources from (Jinja-stripped) markup.
+
+    With ``fold`` set, stop after the first top-level element of the markup
+    closes -- the part of the page that is visible before scrolling.
+    """
+
+    def __init__(self, fold: bool = False):
+        super().__init__()
+        self.names: Set[str] = set()
+        self.images: List[Dict[str, str]] = []
+        self.fold = fold
+        self.depth = 0
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        self.names.add(tag)
+        for name, value in attrs:
+            if name == 'class' and value:
+                self.names.update('.' + c for c in _IDENT.findall(value))
+            elif name == 'id' and value:
+                self.names.add('#' + value)
+        if tag == 'img':
+            self.images.append(dict(attrs))
+        if tag not in ('img', 'input', 'br', 'hr', 'meta', 'link', 'source'):
+            self.depth += 1
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        self.depth -= 1
+        if self.fold and self.depth <= 0:
+            self.done = True
+
+
+def _jinja_strings(match) -> str:
+    return ' '.join(a or b for a, b in _QUOTED.findall(match.group(0)))
+
+
+def _collect(markup: str, fold: bool = False) -> _NameCollector:
+    # Keep string literals from Jinja tags so conditional classes are seen
+    collector = _NameCollector(fold)
+    collector.feed(_JINJA.sub(_jinja_strings, markup))
+    return collector
+
+
+def _template_names(markup: str, fold: bool = False) -> Set[str]:
+    return _collect(markup, fold).names
+
+
+def _read(path: str) -> str:
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def used_names(templates_dir: str = TEMPLATES_DIR) -> Set[str]:
+    """Return every tag, class and id used anywhere in the templates."""
+    names = set()
+    for root, _dirs, files in os.walk(templates_dir):
+        for name in files:
+            if name.endswith('.html'):
+                names |= _template_names(_read(os.path.join(root, name)))
+    return names
+
+
+def page_templates(templates_dir: str = TEMPLATES_DIR) -> List[str]:
+    """Return the top-level templates that extend base.html (one per page)."""
+    return sorted(
+        name for name in os.listdir(templates_dir)
+        if name.endswith('.html') and 'extends "base.html"' in _read(os.path.join(templates_dir, name))
+    )
+
+
+def content_block(template: str, templates_dir: str = TEMPLATES_DIR) -> str:
+    """Return the source of a page's ``content`` block ('' if it has none)."""
+    source = _read(os.path.join(templates_dir, template))
+    match = re.search(r'{%-?\s*block content\s*-?%}(.*?){%-?\s*endblock', source, re.S)
+    return match.group(1) if match else ''
+
+
+def above_the_fold_names(template: str, templates_dir: str = TEMPLATES_DIR) -> Set[str]:
+    """Return the names used by the header and the first content element of a page."""
+    names = {'main'} | _template_names(_read(os.path.join(templates_dir, 'partials', 'header.html')))
+    return names | _template_names(content_block(template, templates_dir), fold=True)
+
+
+def above_the_fold_images(template: str, templates_dir: str = TEMPLATES_DIR) -> List[Dict[str, str]]:
+    """Return the attributes of the ``<img>`` tags in the first content element of a page."""
+    return _collect(content_block(template, templates_dir), fold=True).images
+
+
+# -- build -------------------------------------------------------------------
+
+def _gzip_size(data: bytes) -> int:
+    return len(gzip.compress(data, compresslevel=9, mtime=0))
+
+
+def _write(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def build(out_dir: str = BUILD_DIR, source: str = SOURCE_CSS, templates_dir: str = TEMPLATES_DIR) -> Dict:
+    """Write ``styles.min.css``, ``critical/<page>.css`` and a manifest into ``out_dir``.
+
+    Returns the manifest, which doubles as the size/time report.
+    """
+    started = time.perf_counter()
+    original = _read(source)
+    rules = parse(original)
+    used = used_names(templates_dir)
+    full_css = serialize(prune(rules, used))
+    version = hashlib.sha256(full_css.encode()).hexdigest()[:12]
+    _write(os.path.join(out_dir, STYLESHEET_NAME), full_css)
+
+    critical = {}
+    for template in page_templates(templates_dir):
+        css = serialize(prune(rules, above_the_fold_names(template, templates_dir), drop_interactive=True))
+        rel_path = 'critical/' + template[:-len('.html')] + '.css'
+        _write(os.path.join(out_dir, rel_path), css)
+        critical[template] = {'file': rel_path, 'bytes': len(css.encode())}
+
+    manifest = {
+        'stylesheet': STYLESHEET_NAME,
+        'version': version,
+        'critical': critical,
+        'report': {
+            'source_bytes': len(original.encode()),
+            'source_gzip_bytes': _gzip_size(original.encode()),
+            'minified_bytes': len(minify(original).encode()),
+            'pruned_bytes': len(full_css.encode()),
+            'pruned_gzip_bytes': _gzip_size(full_css.encode()),
+            'seconds': time.perf_counter() - started,
+        },
+    }
+    _write(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+def format_report(manifest: Dict) -> str:
+    report = manifest['report']
+    lines = [
+        f"styles.css          {report['source_bytes']:>7} B  ({report['source_gzip_bytes']} B gzip)",
+        f"minified            {report['minified_bytes']:>7} B",
+        f"minified + pruned   {report['pruned_bytes']:>7} B  ({report['pruned_gzip_bytes']} B gzip)",
+    ]
+    for template, entry in sorted(manifest['critical'].items()):
+        lines.append(f"critical {template:<18} {entry['bytes']:>5} B inline")
+    lines.append(f"built in {report['seconds'] * 1000:.1f} ms")
+    return '\n'.join(lines)
+
+
+# -- serving -----------------------------------------------------------------
+
+class StyleAssets:
+    """Look up built CSS for templates; everything is None until a build exists.
+
+    The manifest is re-read when its mtime changes, so a rebuild is picked up
+    without restarting the app.
+    """
+
+    def __init__(self, build_dir: str, static_url_path: str = '/static'):
+        self.build_dir = build_dir
+        self.static_url_path = static_url_path
+        self._loaded_key = None
+        self._manifest: Optional[Dict] = None
+        self._critical: Dict[str, Markup] = {}
+
+    def _load(self) -> Optional[Dict]:
+        path = os.path.join(self.build_dir, MANIFEST_NAME)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            self._loaded_key = self._manifest = None
+            return None
+        if (path, mtime) != self._loaded_key:
+            with open(path) as f:
+                self._manifest = json.load(f)
+            self._critical = {}
+            self._loaded_key = (path, mtime)
+        return self._manifest
+
+    def critical_css(self, template: Optional[str]) -> Optional[Markup]:
+        manifest = self._load()
+        if manifest is None or template not in manifest['critical']:
+            return None
+        if template not in self._critical:
+            self._critical[template] = Markup(_read(os.path.join(self.build_dir, manifest['critical'][template]['file'])))
+        return self._critical[template]
+
+    def stylesheet_url(self) -> Optional[str]:
+        manifest = self._load()
+        if manifest is None:
+            return None
+        return f"{self.static_url_path}/{BUILD_URL_DIR}/{manifest['stylesheet']}?v={manifest['version']}"
+
+
+def init_app(app) -> StyleAssets:
+    """Expose ``critical_css()`` and ``built_stylesheet()`` to templates and serve the build.
+
+    The build may live outside the static folder (the Docker image keeps it
+    clear of the bind-mounted ``static/``), so it gets its own route, which
+    takes precedence over the static one for ``/static/build/``.
+    """
+    assets = StyleAssets(app.config.get('CSS_BUILD_DIR') or BUILD_DIR, app.static_url_path)
+
+    def built_css(filename):
+        return offload.send_file(assets.build_dir, filename, 'css')
+
+    app.add_url_rule(f"{app.static_url_path}/{BUILD_URL_DIR}/<path:filename>", 'built_css', built_css)
+
+    @pass_context
+    def critical_css(context):
+        # For a page extending base.html the context still carries the page's name
+        return assets.critical_css(context.name)
+
+    app.jinja_env.globals['critical_css'] = critical_css
+    app.jinja_env.globals['built_stylesheet'] = assets.stylesheet_url
+    app.extensions['css_assets'] = assets
+    return assets
+
+
+def _main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Minify and prune styles.css and extract critical CSS per page.")
+    parser.add_argument("--out", default=BUILD_DIR, help="output directory (default: static/build)")
+    args = parser.parse_args(argv)
+    print(format_report(build(args.out)))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,46 @@
+"""Render-once cache for static template fragments shared by every page."""
+import threading
+from typing import Dict, Tuple
+
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """Render context-free template fragments once and reuse the markup.
+
+    A fragment is keyed by its template name plus the keyword arguments it is
+    rendered with, so small variants (e.g. the active nav item) each get their
+    own entry. If Jinja reloads the template, the stale markup is re-rendered.
+    """
+
+    def __init__(self, env):
+        self._env = env
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple, Tuple[object, Markup]] = {}
+        self.renders = 0
+
+    def __call__(self, name: str, **context) -> Markup:
+        key = (name,) + tuple(sorted(context.items()))
+        template = self._env.get_template(name)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is template:
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not template:
+                entry = (template, Markup(template.render(**context)))
+                self._entries[key] = entry
+                self.renders += 1
+        return entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def init_app(app) -> FragmentCache:
+    """Expose ``cached_fragment(name, **context)`` to every template."""
+    cache = FragmentCache(app.jinja_env)
+    app.jinja_env.globals['cached_fragment'] = cache
+    app.extensions['fragment_cache'] = cache
+    return cache
@@ -0,0 +1,275 @@
+"""Export the site as pre-compressed static files so nginx can serve reads without Python."""
+import argparse
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import DAL
+import cssbuild
+
+
+MANIFEST_NAME = 'manifest.json'
+
+# Routes whose output never depends on the database
+STATIC_ROUTES = ['/', '/about', '/resume', '/contact', '/thankyou']
+
+# Asset types worth storing a .gz next to (nginx gzip_static serves it)
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.json', '.svg', '.txt'}
+
+
+def route_to_file(route: str) -> str:
+    """Map a URL path to the file nginx finds with ``try_files $uri.html``."""
+    if route == '/':
+        return 'index.html'
+    return route.strip('/') + '.html'
+
+
+# Detail rows are read from the DAL this many at a time
+DETAIL_BATCH_SIZE = 100
+
+
+def project_routes(page_size: int) -> List[str]:
+    """Return the listing URLs that exist for the current number of projects."""
+    total = DAL.count_projects()
+    pages = max(1, -(-total // page_size))
+    return ['/projects'] + [f'/projects/page/{n}' for n in range(2, pages + 1)]
+
+
+def detail_routes() -> List[str]:
+    """Return the /projects/<id> URL of every project."""
+    return [f'/projects/{project_id}' for project_id in DAL.get_project_ids()]
+
+
+def _detail_id(route: str) -> Optional[int]:
+    """Return the project id of a /projects/<id> route, or None for other routes."""
+    prefix, _, tail = route.rpartition('/')
+    return int(tail) if prefix == '/projects' and tail.isdigit() else None
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_if_changed(path: str, data: bytes, previous: Optional[Dict]) -> Dict:
+    """Write ``data`` (and a .gz copy for text) unless the file already has it."""
+    digest = _sha256(data)
+    entry = {'sha256': digest, 'bytes': len(data)}
+    if previous and previous.get('sha256') == digest and os.path.exists(path):
+        entry.update({k: v for k, v in previous.items() if k == 'gzip_bytes'})
+        entry['written'] = False
+        return entry
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    if os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS:
+        # mtime=0 keeps the .gz byte-identical across exports of the same content
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, path + '.gz')
+            entry['gzip_bytes'] = len(compressed)
+        elif os.path.exists(path + '.gz'):
+            os.remove(path + '.gz')
+    entry['written'] = True
+    return entry
+
+
+def _remove(out_dir: str, rel_path: str) -> None:
+    for path in (os.path.join(out_dir, rel_path), os.path.join(out_dir, rel_path) + '.gz'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def load_manifest(out_dir: str) -> Dict:
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def site_version(app) -> str:
+    """Hash of the templates, static files and CSS build that every exported page depends on.
+
+    Taken from file contents rather than mtimes, since the CSS build is
+    redone (with the same output) every time the container starts.
+    """
+    digest = hashlib.sha256()
+    roots = [os.path.join(app.root_path, app.template_folder), app.static_folder,
+             app.extensions['css_assets'].build_dir]
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                with open(path, 'rb') as f:
+                    digest.update(f'{os.path.relpath(path, root)}:{_sha256(f.read())}\n'.encode())
+    return digest.hexdigest()[:16]
+
+
+def export(app, out_dir: str, full: bool = False) -> Dict[str, List[str]]:
+    """Render every route and copy static assets into ``out_dir``.
+
+    Without ``full``, an existing export is updated in place: the static
+    pages and assets are only rendered if missing, and the project listing
+    pages only if the projects table changed since the last export. A change
+    to the templates, static files or CSS build since the last export (a
+    deploy) re-renders everything, as ``full`` does. Files are rewritten only
+    when their content changed, so unchanged pages keep their mtime (and
+    nginx ETag).
+    """
+    started = time.perf_counter()
+    manifest = {} if full else load_manifest(out_dir)
+    old_pages = manifest.get('pages', {})
+    old_assets = manifest.get('assets', {})
+    version = site_version(app)
+    full = full or manifest.get('site_version') != version
+    fingerprint = DAL.get_projects_fingerprint()
+    projects_changed = full or manifest.get('projects_fingerprint') != fingerprint
+
+    routes = [r for r in STATIC_ROUTES if full or r not in old_pages]
+    current = set()
+    if projects_changed:
+        listings = project_routes(app.config['PROJECTS_PAGE_SIZE'])
+        details = detail_routes()
+        current = set(listings) | set(details)
+        # Projects are never edited in place, so existing detail pages stay valid
+        routes += listings + [r for r in details if full or r not in old_pages]
+
+    client = app.test_client()
+    pages = dict(old_pages)
+    result = {'rendered': [], 'written': [], 'removed': []}
+    render_detail = app.extensions.get('render_project_detail')
+    batch: Dict[int, Dict] = {}
+    for index, route in enumerate(routes):
+        project_id = _detail_id(route)
+        if render_detail is not None and project_id is not None:
+            if project_id not in batch:
+                # One query per batch of detail pages; read directly so the export
+                # neither churns nor is served from the app's hot-object cache
+                ids = [i for i in map(_detail_id, routes[index:index + DETAIL_BATCH_SIZE]) if i is not None]
+                batch = {p['id']: p for p in DAL.get_projects_by_ids(ids)}
+            if project_id not in batch:
+                raise RuntimeError(f"Exporting {route}: project {project_id} no longer exists")
+            with app.test_request_context(route):
+                body = render_detail(batch[project_id]).encode()
+        else:
+            response = client.get(route)
+            if response.status_code != 200:
+                raise RuntimeError(f"Exporting {route} returned HTTP {response.status_code}")
+            body = response.get_data()
+        rel_path = route_to_file(route)
+        entry = _write_if_changed(os.path.join(out_dir, rel_path), body, old_pages.get(route))
+        result['rendered'].append(route)
+        if entry.pop('written'):
+            result['written'].append(rel_path)
+        entry.update({'file': rel_path, 'depends_on': [] if route in STATIC_ROUTES else ['projects']})
+        pages[route] = entry
+
+    if projects_changed:
+        # Drop listing and detail pages that no longer exist after deletes
+        for route, entry in list(pages.items()):
+            if 'projects' in entry.get('depends_on', []) and route not in current:
+                _remove(out_dir, entry['file'])
+                result['removed'].append(entry['file'])
+                del pages[route]
+
+    assets = {} if full else dict(old_assets)
+    if full or not old_assets:
+        sources = [(app.static_folder, 'static')]
+        build_dir = app.extensions['css_assets'].build_dir
+        if os.path.relpath(build_dir, app.static_folder).startswith('..'):
+            # The CSS build lives outside static/ but is served under /static/build/
+            sources.append((build_dir, 'static/' + cssbuild.BUILD_URL_DIR))
+        for static_dir, url_dir in sources:
+            for root, _dirs, files in os.walk(static_dir):
+                for name in files:
+                    src = os.path.join(root, name)
+                    rel_path = os.path.join(url_dir, os.path.relpath(src, static_dir)).replace(os.sep, '/')
+                    with open(src, 'rb') as f:
+                        entry = _write_if_changed(os.path.join(out_dir, rel_path), f.read(), old_assets.get(rel_path))
+                    if entry.pop('written'):
+                        result['written'].append(rel_path)
+                    assets[rel_path] = entry
+
+    manifest = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'projects_fingerprint': fingerprint,
+        'site_version': version,
+        'pages': pages,
+        'assets': assets,
+    }
+    _write_if_changed(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode(), None)
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+class AutoExporter:
+    """Re-export the listing pages shortly after each DAL write.
+
+    Writes are debounced so a burst of saves triggers a single export, which
+    runs on a background thread instead of the request that made the write.
+    """
+
+    def __init__(self, app, out_dir: str, delay: float = 1.0):
+        self.app = app
+        self.out_dir = out_dir
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.last_result: Optional[Dict] = None
+
+    def __call__(self, event: str, project_id: Optional[int]) -> None:
+        # Run the export in the writer's context so it sees the same database
+        ctx = contextvars.copy_context()
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, ctx.run, args=(self.run,))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def run(self) -> Dict:
+        with self._lock:
+            self._timer = None
+        with self._export_lock:
+            self.last_result = export(self.app, self.out_dir)
+        return self.last_result
+
+    def start(self) -> None:
+        DAL.add_change_listener(self)
+
+    def stop(self) -> None:
+        DAL.remove_change_listener(self)
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+def _main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export the site as static files for nginx.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--full", action="store_true", help="re-render everything instead of only what changed")
+    args = parser.parse_args(argv)
+
+    from app import app, db_setup
+    db_setup.ensure()
+    result = export(app, args.out_dir, full=args.full)
+    print(f"Rendered {len(result['rendered'])} pages, wrote {len(result['written'])} files, "
+          f"removed {len(result['removed'])} in {result['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    _main()
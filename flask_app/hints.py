@@ -0,0 +1,124 @@
+"""Preload hints for each page's critical resources, sent as ``Link`` headers."""
+import argparse
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from flask import g, has_request_context, request, template_rendered
+
+import cssbuild
+
+
+STATIC_DIR = os.path.join(cssbuild.APP_DIR, 'static')
+
+
+def image_size(path: str) -> Optional[Tuple[int, int]]:
+    """Return ``(width, height)`` of a JPEG or PNG file, or None if it is neither."""
+    with open(path, 'rb') as f:
+        head = f.read(24)
+        if head.startswith(b'\x89PNG\r\n\x1a\n'):
+            return struct.unpack('>II', head[16:24])
+        if not head.startswith(b'\xff\xd8'):
+            return None
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            length = struct.unpack('>H', f.read(2))[0]
+            # Start-of-frame markers (not DHT/JPG/DAC) carry the image size
+            if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>xHH', f.read(5))
+                return width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def _static_path(src: str, static_dir: str) -> Optional[str]:
+    """Map a literal ``/static/...`` URL to its file, or None for anything else."""
+    if not src or not src.startswith('/static/') or '{' in src or ' ' in src:
+        return None
+    path = os.path.join(static_dir, *src[len('/static/'):].split('/'))
+    return path if os.path.isfile(path) else None
+
+
+def scan_templates(templates_dir: str = cssbuild.TEMPLATES_DIR, static_dir: str = STATIC_DIR) -> Dict[str, List[Dict]]:
+    """Build the preload manifest: the above-the-fold images of every page template."""
+    manifest = {}
+    for template in cssbuild.page_templates(templates_dir):
+        resources = []
+        for attrs in cssbuild.above_the_fold_images(template, templates_dir):
+            path = _static_path(attrs.get('src', ''), static_dir)
+            if path is not None:
+                resources.append({'href': attrs['src'], 'as': 'image'})
+        manifest[template] = resources
+    return manifest
+
+
+def format_link(resource: Dict) -> str:
+    return f"<{resource['href']}>; rel=preload; as={resource['as']}"
+
+
+class PreloadHints:
+    """Add ``Link: rel=preload`` headers for the stylesheet and hero images of HTML pages.
+
+    Which template an endpoint renders is learned from the ``template_rendered``
+    signal, so pages served from a cache still get their hints.
+    """
+
+    def __init__(self, app=None):
+        self.manifest: Optional[Dict[str, List[Dict]]] = None
+        self.endpoint_templates: Dict[str, str] = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        self.app = app
+        template_rendered.connect(self._template_rendered, app)
+        app.before_request(self._reset)
+        app.after_request(self._add_headers)
+        app.extensions['preload_hints'] = self
+
+    @staticmethod
+    def _reset() -> None:
+        # g outlives the request when an app context was already pushed
+        g.pop('preload_template', None)
+
+    def _template_rendered(self, sender, template, context, **extra) -> None:
+        # The first template rendered in a request is the page; base.html is
+        # inherited, not rendered on its own
+        if has_request_context() and request.endpoint and 'preload_template' not in g:
+            g.preload_template = template.name
+            self.endpoint_templates[request.endpoint] = template.name
+
+    def resources(self, template: Optional[str]) -> List[Dict]:
+        if self.manifest is None:
+            # Generated on first use, so it always matches the deployed templates
+            self.manifest = scan_templates(os.path.join(self.app.root_path, self.app.template_folder), self.app.static_folder)
+        stylesheet = self.app.extensions['css_assets'].stylesheet_url() or '/static/styles.css'
+        return [{'href': stylesheet, 'as': 'style'}] + self.manifest.get(template, [])
+
+    def _add_headers(self, response):
+        if response.status_code != 200 or response.mimetype != 'text/html':
+            return response
+        template = g.get('preload_template') or self.endpoint_templates.get(request.endpoint)
+        if template is None:
+            return response
+        links = [format_link(r) for r in self.resources(template)]
+        response.headers.add('Link', ', '.join(links))
+        return response
+
+
+def _main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Print the preload manifest generated from the templates.")
+    parser.parse_args(argv)
+    manifest = scan_templates()
+    for resources in manifest.values():
+        for resource in resources:
+            path = _static_path(resource['href'], STATIC_DIR)
+            resource['size'] = image_size(path)
+    print(json.dumps(manifest, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,309 @@
+"""Online backups and routine upkeep (ANALYZE, vacuum, WAL checkpoints, purges) for projects.db."""
+import argparse
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import DAL
+import metrics
+import tenants
+
+
+BACKUP_PREFIX = 'projects-'
+
+metrics.registry.describe('db_size_bytes', 'gauge', 'Size of the main database file')
+metrics.registry.describe('db_wal_size_bytes', 'gauge', 'Size of the write-ahead log')
+metrics.registry.describe('db_freelist_pages', 'gauge', 'Unused pages that vacuum can reclaim')
+metrics.registry.describe('db_maintenance_last_duration_seconds', 'gauge', 'Duration of the last run of each maintenance task')
+metrics.registry.describe('db_maintenance_runs_total', 'counter', 'Maintenance task runs by outcome')
+
+
+def _connect() -> sqlite3.Connection:
+    # Autocommit: every PRAGMA below manages its own locking
+    return sqlite3.connect(DAL.get_db_path(), timeout=30, isolation_level=None)
+
+
+def db_stats() -> Dict[str, int]:
+    """Return file sizes and page counts for the current database."""
+    db_path = DAL.get_db_path()
+    conn = _connect()
+    try:
+        page_size = conn.execute("PRAGMA page_size;").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count;").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+    finally:
+        conn.close()
+    wal_path = db_path + '-wal'
+    return {
+        'size_bytes': os.path.getsize(db_path) if os.path.exists(db_path) else 0,
+        'wal_size_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_pages': freelist,
+    }
+
+
+def collect_db_metrics(registry: metrics.Metrics) -> None:
+    """Metrics collector that publishes the database size gauges."""
+    stats = db_stats()
+    registry.set('db_size_bytes', stats['size_bytes'])
+    registry.set('db_wal_size_bytes', stats['wal_size_bytes'])
+    registry.set('db_freelist_pages', stats['freelist_pages'])
+
+
+def backup(dest_path: str, pages: int = 256, sleep: float = 0.005) -> Dict[str, float]:
+    """Copy the live database to ``dest_path`` with SQLite's online backup API.
+
+    The copy is made ``pages`` pages at a time, releasing the read lock and
+    sleeping between steps so writers are never blocked for long. It is
+    written to a temporary file and renamed into place, so ``dest_path`` is
+    always either the previous backup or a complete new one.
+    """
+    started = time.perf_counter()
+    tmp_path = dest_path + '.tmp'
+    src = sqlite3.connect(DAL.get_db_path(), timeout=30)
+    dst = sqlite3.connect(tmp_path)
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        # sqlite3's own ``sleep`` only applies to busy/locked steps; pause between every step
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    try:
+        src.backup(dst, pages=pages, progress=progress)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp_path, dest_path)
+    return {'seconds': time.perf_counter() - started, 'steps': steps, 'bytes': os.path.getsize(dest_path)}
+
+
+def snapshot(backup_dir: str, keep: int = 7, **backup_options) -> str:
+    """Write a timestamped backup into ``backup_dir`` and prune all but the newest ``keep``."""
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    dest_path = os.path.join(backup_dir, f'{BACKUP_PREFIX}{stamp}.db')
+    backup(dest_path, **backup_options)
+    snapshots = sorted(
+        name for name in os.listdir(backup_dir)
+        if name.startswith(BACKUP_PREFIX) and name.endswith('.db')
+    )
+    for name in snapshots[:-keep] if keep > 0 else []:
+        os.remove(os.path.join(backup_dir, name))
+    return dest_path
+
+
+def analyze() -> None:
+    """Refresh query-planner statistics where SQLite thinks they are stale."""
+    conn = _connect()
+    try:
+        conn.execute("PRAGMA analysis_limit=1000;")
+        conn.execute("PRAGMA optimize;")
+    finally:
+        conn.close()
+
+
+def incremental_vacuum(max_pages: int = 1000) -> int:
+    """Return up to ``max_pages`` free pages to the filesystem and return how many were freed.
+
+    Needs ``auto_vacuum=INCREMENTAL``, which new databases get from
+    ``DAL.migrate``; older ones can be converted once with
+    ``enable_incremental_vacuum``. Otherwise this is a no-op.
+    """
+    conn = _connect()
+    try:
+        if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] != 2:
+            return 0
+        before = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        # executescript steps the pragma to completion; execute() would free one page
+        conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+        after = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+        return before - after
+    finally:
+        conn.close()
+
+
+def enable_incremental_vacuum() -> None:
+    """Switch an existing database to incremental auto-vacuum (runs a full, blocking VACUUM once)."""
+    conn = _connect()
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+        conn.execute("VACUUM;")
+    finally:
+        conn.close()
+
+
+def checkpoint(mode: str = 'PASSIVE') -> Dict[str, int]:
+    """Copy WAL frames back into the database; TRUNCATE also shrinks the WAL file."""
+    mode = mode.upper()
+    if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+        raise ValueError(f"Unknown checkpoint mode: {mode!r}")
+    conn = _connect()
+    try:
+        busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode});").fetchone()
+    finally:
+        conn.close()
+    return {'busy': busy, 'log_frames': log_frames, 'checkpointed_frames': checkpointed}
+
+
+class MaintenanceScheduler:
+    """Run maintenance tasks at fixed intervals on a background thread.
+
+    Each run's duration and outcome are recorded in ``metrics.registry``.
+    """
+
+    def __init__(self, registry: Optional[metrics.Metrics] = None):
+        self.registry = registry or metrics.registry
+        self._tasks: List[Dict] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_task(self, name: str, interval: float, func: Callable[[], object], run_at_start: bool = False) -> None:
+        next_run = time.monotonic() if run_at_start else time.monotonic() + interval
+        self._tasks.append({'name': name, 'interval': interval, 'func': func, 'next_run': next_run})
+
+    def run_task(self, task: Dict) -> None:
+        started = time.perf_counter()
+        status = 'ok'
+        try:
+            task['func']()
+        except Exception:
+            status = 'error'
+        self.registry.set('db_maintenance_last_duration_seconds', time.perf_counter() - started, task=task['name'])
+        self.registry.inc('db_maintenance_runs_total', task=task['name'], status=status)
+        task['next_run'] = time.monotonic() + task['interval']
+
+    def run_pending(self) -> List[str]:
+        """Run every task that is due and return their names."""
+        now = time.monotonic()
+        ran = []
+        for task in self._tasks:
+            if task['next_run'] <= now:
+                self.run_task(task)
+                ran.append(task['name'])
+        return ran
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.run_pending()
+            next_run = min((t['next_run'] for t in self._tasks), default=time.monotonic() + 60)
+            self._stop.wait(max(0.0, next_run - time.monotonic()))
+
+    def start(self) -> threading.Thread:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='db-maintenance', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def _every_database(config: Dict, func: Callable[[], object],
+                    is_busy: Optional[Callable[[], bool]] = None) -> Callable[[], None]:
+    """Wrap ``func`` to run on the default database and, with ``TENANT_MODE`` set, on each tenant shard.
+
+    Shards are visited one at a time, skipping the rest once ``is_busy``
+    says the app has traffic. A failing shard does not stop the others; the
+    first error is raised at the end so the run is recorded as failed.
+    """
+    def run() -> None:
+        func()
+        if not config.get('TENANT_MODE'):
+            return
+        tenant_dir = config.get('TENANT_DIR') or tenants.DEFAULT_TENANT_DIR
+        errors = []
+        for tenant in tenants.list_shards(tenant_dir):
+            if is_busy is not None and is_busy():
+                break
+            result = tenants.fan_out(tenant_dir, func, [tenant], max_workers=1)[tenant]
+            if isinstance(result, Exception):
+                errors.append(result)
+        if errors:
+            raise errors[0]
+
+    return run
+
+
+def default_scheduler(config: Dict, is_busy: Optional[Callable[[], bool]] = None) -> MaintenanceScheduler:
+    """Build a scheduler from ``MAINTENANCE_*``/``BACKUP_*``/``PURGE_*`` settings in ``config``.
+
+    ``is_busy`` tells the tombstone purge to stop between batches while the
+    app is serving traffic, so it only does its work in quiet periods. Both
+    purges also cover every tenant shard when ``TENANT_MODE`` is set.
+    """
+    scheduler = MaintenanceScheduler()
+    scheduler.add_task('checkpoint', config.get('MAINTENANCE_CHECKPOINT_INTERVAL', 300), checkpoint)
+    scheduler.add_task('analyze', config.get('MAINTENANCE_ANALYZE_INTERVAL', 3600), analyze)
+    scheduler.add_task('incremental_vacuum', config.get('MAINTENANCE_VACUUM_INTERVAL', 3600), incremental_vacuum)
+    key_ttl = config.get('IDEMPOTENCY_KEY_TTL', 86400)
+    scheduler.add_task(
+        'purge_idempotency_keys', config.get('MAINTENANCE_PURGE_INTERVAL', 3600),
+        _every_database(config, lambda: DAL.purge_idempotency_keys(key_ttl)),
+    )
+    retention = config.get('PURGE_DELETED_AFTER', 86400)
+    batch_size = config.get('PURGE_BATCH_SIZE', 100)
+    scheduler.add_task(
+        'purge_deleted', config.get('MAINTENANCE_PURGE_INTERVAL', 3600),
+        _every_database(config, lambda: DAL.purge_deleted(retention, batch_size, pause=0.05, should_stop=is_busy), is_busy),
+    )
+    backup_dir = config.get('BACKUP_DIR')
+    if backup_dir:
+        keep = config.get('BACKUP_KEEP', 7)
+        scheduler.add_task(
+            'snapshot', config.get('BACKUP_INTERVAL', 86400), lambda: snapshot(backup_dir, keep=keep),
+        )
+    return scheduler
+
+
+def _main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Back up and maintain the projects database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    backup_parser = sub.add_parser("backup", help="copy the live database to a file")
+    backup_parser.add_argument("dest")
+    snapshot_parser = sub.add_parser("snapshot", help="write a timestamped backup and prune old ones")
+    snapshot_parser.add_argument("backup_dir")
+    snapshot_parser.add_argument("--keep", type=int, default=7)
+    sub.add_parser("analyze", help="refresh query planner statistics")
+    sub.add_parser("vacuum", help="run an incremental vacuum step")
+    sub.add_parser("enable-incremental-vacuum", help="convert the database to incremental auto-vacuum")
+    checkpoint_parser = sub.add_parser("checkpoint", help="checkpoint the WAL")
+    checkpoint_parser.add_argument("--mode", default="TRUNCATE")
+    sub.add_parser("stats", help="print database size and page counts")
+    purge_parser = sub.add_parser("purge-deleted", help="permanently remove deleted projects")
+    purge_parser.add_argument("--older-than", type=float, default=0, help="only those deleted this many seconds ago")
+    purge_parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.command == "backup":
+        result = backup(args.dest)
+    elif args.command == "snapshot":
+        result = snapshot(args.backup_dir, keep=args.keep)
+    elif args.command == "analyze":
+        result = analyze()
+    elif args.command == "vacuum":
+        result = {'freed_pages': incremental_vacuum()}
+    elif args.command == "enable-incremental-vacuum":
+        result = enable_incremental_vacuum()
+    elif args.command == "checkpoint":
+        result = checkpoint(args.mode)
+    elif args.command == "purge-deleted":
+        result = {'purged': DAL.purge_deleted(args.older_than, args.batch_size)}
+    else:
+        result = db_stats()
+    print(f"{args.command} finished in {time.perf_counter() - started:.3f}s")
+    if result is not None:
+        print(result)
+
+
+if __name__ == "__main__":
+    _main()
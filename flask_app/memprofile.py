@@ -0,0 +1,117 @@
+"""Opt-in allocation tracking with tracemalloc: peak memory and top allocation sites per route."""
+import threading
+import tracemalloc
+from typing import Dict, List, Optional
+
+from flask import g, request
+
+import metrics
+
+
+metrics.registry.describe('request_peak_memory_bytes', 'gauge',
+                          'Largest peak of memory allocated while serving one request, per route')
+metrics.registry.describe('request_last_peak_memory_bytes', 'gauge', 'Peak memory allocated by the latest request, per route')
+metrics.registry.describe('tracemalloc_traced_bytes', 'gauge', 'Memory currently allocated by Python, as seen by tracemalloc')
+metrics.registry.describe('tracemalloc_peak_bytes', 'gauge', 'Highest memory allocated by Python since tracing started')
+
+
+def _sites(stats: List[tracemalloc.StatisticDiff], limit: int) -> List[Dict]:
+    return [
+        {'site': str(stat.traceback[0]), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff}
+        for stat in stats[:limit]
+    ]
+
+
+class MemoryProfiler:
+    """Record the peak allocation of every request and where its worst one allocated.
+
+    tracemalloc's peak is process-wide, so requests are profiled one at a
+    time: each holds a lock from its first ``before_request`` hook to
+    teardown. That makes the numbers exact but serialises the app, so this
+    is a diagnosis mode, not something to leave on in production.
+
+    For the request with the highest peak on each route, the allocations
+    still alive at teardown are compared with the start of the request and
+    the ``top`` sites that grew the most are kept: the rendered body,
+    cache entries and anything else the request left behind.
+    """
+
+    def __init__(self, frames: int = 1, top: int = 10):
+        self.frames = frames
+        self.top = top
+        self.routes: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._request_lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        # Run before the other hooks so their allocations are counted
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start)
+        app.teardown_request(self._finish)
+        metrics.registry.register_collector(self._collect)
+        app.extensions['memory_profiler'] = self
+
+    def _start(self) -> None:
+        self._request_lock.acquire()
+        g.memory_profiled = True
+        g.memory_baseline = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        g.memory_start = tracemalloc.get_traced_memory()[0]
+
+    def _finish(self, exc) -> None:
+        if not g.pop('memory_profiled', False):
+            return
+        try:
+            current, peak = tracemalloc.get_traced_memory()
+            request_peak = peak - g.pop('memory_start')
+            baseline = g.pop('memory_baseline')
+            route = request.url_rule.rule if request.url_rule else '<unmatched>'
+            with self._lock:
+                stats = self.routes.setdefault(route, {'requests': 0, 'peak_bytes': 0, 'last_peak_bytes': 0, 'top': []})
+                stats['requests'] += 1
+                stats['last_peak_bytes'] = request_peak
+                worst = request_peak > stats['peak_bytes']
+                if worst:
+                    stats['peak_bytes'] = request_peak
+            if worst:
+                diff = tracemalloc.take_snapshot().filter_traces(self._filters()).compare_to(
+                    baseline.filter_traces(self._filters()), 'lineno')
+                with self._lock:
+                    stats['top'] = _sites(diff, self.top)
+        finally:
+            self._request_lock.release()
+
+    @staticmethod
+    def _filters() -> List[tracemalloc.Filter]:
+        return [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+
+    def report(self, top: Optional[int] = None) -> Dict:
+        """Return the per-route stats plus the largest allocation sites alive right now."""
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(self._filters())
+        live = [
+            {'site': str(stat.traceback[0]), 'size': stat.size, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:top or self.top]
+        ]
+        with self._lock:
+            routes = {route: dict(stats) for route, stats in self.routes.items()}
+        return {'traced_bytes': current, 'peak_bytes': peak, 'routes': routes, 'top': live}
+
+    def _collect(self, registry: metrics.Metrics) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        registry.set('tracemalloc_traced_bytes', current)
+        registry.set('tracemalloc_peak_bytes', peak)
+        with self._lock:
+            for route, stats in self.routes.items():
+                registry.set('request_peak_memory_bytes', stats['peak_bytes'], route=route)
+                registry.set('request_last_peak_memory_bytes', stats['last_peak_bytes'], route=route)
+
+
+def init_app(app) -> Optional[MemoryProfiler]:
+    """Turn on allocation tracking if ``MEMORY_PROFILE`` is set."""
+    if not app.config.get('MEMORY_PROFILE'):
+        return None
+    profiler = MemoryProfiler(app.config.get('MEMORY_PROFILE_FRAMES', 1), app.config.get('MEMORY_PROFILE_TOP', 10))
+    profiler.init_app(app)
+    return profiler
@@ -0,0 +1,90 @@
+"""Process-local metrics registry rendered in the Prometheus text format."""
+import threading
+from typing import Callable, Dict, List, Tuple
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ''
+    parts = []
+    for name, value in key:
+        escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{escaped}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics:
+    """Thread-safe counters and gauges, plus collectors evaluated at scrape time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+        self._types: Dict[str, str] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[['Metrics'], None]] = []
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        with self._lock:
+            self._types[name] = kind
+            self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._types.setdefault(name, 'counter')
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._types.setdefault(name, 'gauge')
+            self._values.setdefault(name, {})[key] = value
+
+    def get(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._values.get(name, {}).get(_label_key(labels), 0)
+
+    def register_collector(self, collector: Callable[['Metrics'], None]) -> None:
+        """Call ``collector(metrics)`` before every render to refresh derived gauges."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            try:
+                collector(self)
+            except Exception:
+                # A broken collector must not take the whole endpoint down
+                self.inc('metrics_collector_errors_total')
+        lines = []
+        with self._lock:
+            for name in sorted(self._values):
+                if name in self._help:
+                    lines.append(f'# HELP {name} {self._help[name]}')
+                lines.append(f'# TYPE {name} {self._types.get(name, "untyped")}')
+                for key, value in sorted(self._values[name].items()):
+                    lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+registry = Metrics()
@@ -0,0 +1,54 @@
+"""Hand file downloads to nginx via X-Accel-Redirect and make HTML responses conditional."""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Response, abort, current_app, request, send_from_directory
+from werkzeug.security import safe_join
+
+
+def send_file(directory: str, filename: str, internal_location: str):
+    """Serve ``directory/filename``, or tell nginx to serve it when offloading is on.
+
+    With ``ACCEL_REDIRECT_PREFIX`` set, the response carries no body, only an
+    ``X-Accel-Redirect`` to ``<prefix>/<internal_location>/<filename>``; nginx
+    maps that internal location onto the same files and streams them, so no
+    file bytes pass through Python.
+    """
+    prefix = current_app.config.get('ACCEL_REDIRECT_PREFIX')
+    if not prefix:
+        return send_from_directory(directory, filename)
+
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.headers['X-Accel-Redirect'] = f"{prefix.rstrip('/')}/{internal_location}/{quote(filename)}"
+    return response
+
+
+def conditional_html(response):
+    """Give full HTML pages an ETag and answer matching revalidations with 304.
+
+    nginx's microcache revalidates expired entries with If-None-Match
+    (``proxy_cache_revalidate``), so an unchanged page costs Flask a render
+    but no body on the wire; browsers revalidate the same way.
+    """
+    if (request.method in ('GET', 'HEAD') and response.status_code == 200
+            and response.mimetype == 'text/html' and not response.direct_passthrough):
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
+def init_app(app) -> None:
+    """Route static files through ``send_file`` and make HTML responses conditional."""
+    send_static_file = app.send_static_file
+
+    def static(filename):
+        if not app.config.get('ACCEL_REDIRECT_PREFIX'):
+            return send_static_file(filename)
+        return send_file(app.static_folder, filename, 'static')
+
+    app.view_functions['static'] = static
+    app.after_request(conditional_html)
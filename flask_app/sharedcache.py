@@ -0,0 +1,231 @@
+"""Rendered-page cache in a local SQLite file, shared by every worker process on the host."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import DAL
+import metrics
+
+
+metrics.registry.describe('shared_cache_entries', 'gauge', 'Pages stored in the host-wide shared page cache')
+metrics.registry.describe('shared_cache_bytes', 'gauge', 'Size of the pages stored in the host-wide shared page cache')
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS pages (
+        Scope TEXT NOT NULL,
+        Key TEXT NOT NULL,
+        Generation INTEGER NOT NULL,
+        Body BLOB NOT NULL,
+        LastUsed REAL NOT NULL,
+        PRIMARY KEY (Scope, Key)
+    ) WITHOUT ROWID;
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_pages_last_used ON pages (LastUsed);",
+    "CREATE TABLE IF NOT EXISTS generations (Scope TEXT PRIMARY KEY, Value INTEGER NOT NULL) WITHOUT ROWID;",
+    """
+    CREATE TABLE IF NOT EXISTS leases (
+        Scope TEXT NOT NULL,
+        Key TEXT NOT NULL,
+        Expires REAL NOT NULL,
+        PRIMARY KEY (Scope, Key)
+    ) WITHOUT ROWID;
+    """,
+]
+
+
+class SharedPageCache:
+    """LRU cache of rendered pages that all workers on a host read and fill.
+
+    Pages belong to a *scope* (the projects database they were rendered
+    from). Each scope has a generation number kept in the same file; a DAL
+    write in any worker bumps it, so every worker stops serving older pages
+    at once. On a miss one worker takes a short lease on the key and renders
+    while the others wait for its result, so each change costs one render
+    per host rather than one per worker. Past ``max_entries`` pages, the
+    least recently used are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int = 2000, lease_seconds: float = 2.0, touch_interval: float = 10.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.lease_seconds = lease_seconds
+        # Recency is only written back this often per page, so hits stay reads
+        self.touch_interval = touch_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._sets = 0
+
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use, so each forked worker gets its own connection
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=OFF;")  # a lost page is just re-rendered
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    def generation(self, scope: str) -> int:
+        with self._lock:
+            row = self._db().execute("SELECT Value FROM generations WHERE Scope=?;", (scope,)).fetchone()
+        return row[0] if row else 0
+
+    def invalidate(self, scope: str) -> None:
+        """Make every page of ``scope`` stale in all workers."""
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO generations (Scope, Value) VALUES (?, 1) "
+                "ON CONFLICT (Scope) DO UPDATE SET Value = Value + 1;",
+                (scope,),
+            )
+
+    def on_change(self, event: str, project_id: Optional[int]) -> None:
+        """DAL change listener; runs in the writer's context, so this is the database that changed."""
+        self.invalidate(DAL.get_db_path())
+
+    def get(self, key: str, scope: str) -> Optional[bytes]:
+        """Return the page stored under ``key`` if it is from the current generation of ``scope``."""
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            row = conn.execute(
+                """
+                SELECT p.Body, p.LastUsed FROM pages AS p
+                LEFT JOIN generations AS g ON g.Scope = p.Scope
+                WHERE p.Key = ? AND p.Scope = ? AND p.Generation = coalesce(g.Value, 0);
+                """,
+                (key, scope),
+            ).fetchone()
+            if row is not None and now - row[1] >= self.touch_interval:
+                conn.execute("UPDATE pages SET LastUsed=? WHERE Scope=? AND Key=?;", (now, scope, key))
+        return row[0] if row else None
+
+    def set(self, key: str, scope: str, generation: int, body: bytes) -> None:
+        """Store ``body``, rendered when ``scope`` was at ``generation``."""
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (Scope, Key, Generation, Body, LastUsed) VALUES (?,?,?,?,?);",
+                (scope, key, generation, body, time.time()),
+            )
+            self._sets += 1
+            # Counting the table on every store would cost more than the store
+            if self._sets % 32 == 0:
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        cur = conn.execute(
+            """
+            DELETE FROM pages WHERE (Scope, Key) IN (
+                SELECT Scope, Key FROM pages ORDER BY LastUsed
+                LIMIT max(0, (SELECT count(*) FROM pages) - ?)
+            );
+            """,
+            (self.max_entries,),
+        )
+        return cur.rowcount
+
+    def evict(self) -> int:
+        """Drop least recently used pages beyond ``max_entries``; return how many."""
+        with self._lock:
+            return self._evict(self._db())
+
+    def _lease(self, key: str, scope: str) -> bool:
+        now = time.time()
+        with self._lock:
+            cur = self._db().execute(
+                "INSERT INTO leases (Scope, Key, Expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (Scope, Key) DO UPDATE SET Expires = excluded.Expires WHERE Expires < ?;",
+                (scope, key, now + self.lease_seconds, now),
+            )
+        return cur.rowcount > 0
+
+    def _release(self, key: str, scope: str) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM leases WHERE Scope=? AND Key=?;", (scope, key))
+
+    def get_or_render(self, key: str, scope: str, render: Callable[[], bytes]) -> Tuple[bytes, str]:
+        """Return ``(body, status)``: ``hit``, ``miss`` (rendered and stored here) or ``coalesced``.
+
+        A worker that finds another one rendering the page polls for its
+        result; if that render fails or takes longer than ``lease_seconds``,
+        it takes over the lease and renders the page itself.
+        """
+        body = self.get(key, scope)
+        if body is not None:
+            return body, 'hit'
+        while not self._lease(key, scope):
+            time.sleep(0.01)
+            body = self.get(key, scope)
+            if body is not None:
+                return body, 'coalesced'
+        try:
+            # Read before rendering: a write that races the render makes the page stale at once
+            generation = self.generation(scope)
+            body = render()
+            self.set(key, scope, generation, body)
+        finally:
+            self._release(key, scope)
+        return body, 'miss'
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count, size = self._db().execute("SELECT count(*), coalesce(sum(length(Body)), 0) FROM pages;").fetchone()
+        return {'entries': count, 'bytes': size}
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._db()
+            conn.execute("DELETE FROM pages;")
+            conn.execute("DELETE FROM leases;")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_templates_version: Optional[str] = None
+
+
+def templates_version(app) -> str:
+    """Fingerprint of the templates and CSS build this process renders with.
+
+    Part of every page key, so a deploy never serves pages rendered by the
+    previous release, while workers of the same release share them.
+    """
+    global _templates_version
+    if _templates_version is None:
+        digest = hashlib.sha1()
+        roots = [os.path.join(app.root_path, app.template_folder), app.config.get('CSS_BUILD_DIR') or '']
+        for root in roots:
+            for dirpath, _dirnames, filenames in sorted(os.walk(root)):
+                for name in sorted(filenames):
+                    stat = os.stat(os.path.join(dirpath, name))
+                    digest.update(f'{dirpath}/{name}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+        _templates_version = digest.hexdigest()[:12]
+    return _templates_version
+
+
+def init_app(app) -> Optional[SharedPageCache]:
+    """Share rendered pages between workers through ``SHARED_CACHE_PATH`` (empty: off)."""
+    path = app.config.get('SHARED_CACHE_PATH')
+    if not path:
+        return None
+    cache = SharedPageCache(path, app.config.get('SHARED_CACHE_MAX_ENTRIES', 2000))
+    DAL.add_change_listener(cache.on_change)
+
+    def collect(registry: metrics.Metrics) -> None:
+        stats = cache.stats()
+        registry.set('shared_cache_entries', stats['entries'])
+        registry.set('shared_cache_bytes', stats['bytes'])
+
+    metrics.registry.register_collector(collect)
+    app.extensions['shared_page_cache'] = cache
+    return cache
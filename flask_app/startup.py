@@ -0,0 +1,117 @@
+"""Cold-start helpers: deferred DB setup, template precompilation and timing."""
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from jinja2 import FileSystemBytecodeCache
+
+
+DEFAULT_TEMPLATE_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'flask_app-jinja-cache')
+
+
+class StartupTimer:
+    """Collect named startup phases and report how long each one took."""
+
+    def __init__(self, started: Optional[float] = None):
+        self.started = started if started is not None else time.perf_counter()
+        self._phases: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the body of a ``with`` block as phase ``name``."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def mark(self, name: str) -> None:
+        """Record the time elapsed since the timer started as phase ``name``."""
+        self.record(name, time.perf_counter() - self.started)
+
+    def report(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._phases)
+
+    def format(self) -> str:
+        lines = ["Startup time breakdown:"]
+        for name, seconds in self.report().items():
+            lines.append(f"  {name:<20} {seconds * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+class DeferredInit:
+    """Run a setup callable exactly once, either in the background or on first use."""
+
+    def __init__(self, func: Callable[[], None], timer: Optional[StartupTimer] = None, name: str = 'db_init'):
+        self._func = func
+        self._timer = timer
+        self._name = name
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def _run(self) -> None:
+        with self._lock:
+            if self._done.is_set():
+                return
+            t0 = time.perf_counter()
+            self._func()
+            if self._timer is not None:
+                self._timer.record(self._name, time.perf_counter() - t0)
+            self._done.set()
+
+    def start_background(self) -> threading.Thread:
+        """Start the setup on a daemon thread; ``ensure`` will wait for it."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def ensure(self) -> None:
+        """Block until setup has run, running it on this thread if nobody has."""
+        if not self._done.is_set():
+            self._run()
+
+
+def configure_bytecode_cache(app, cache_dir: Optional[str] = None) -> FileSystemBytecodeCache:
+    """Attach a filesystem bytecode cache so compiled templates survive restarts.
+
+    The cache directory is shared by every worker on the host; Jinja keys each
+    entry by a checksum of the template source, so stale entries are never used.
+    """
+    cache_dir = cache_dir or DEFAULT_TEMPLATE_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    cache = FileSystemBytecodeCache(cache_dir)
+    app.jinja_env.bytecode_cache = cache
+    return cache
+
+
+def precompile_templates(app) -> int:
+    """Compile every HTML template (filling the bytecode cache) and return the count."""
+    names = app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_up(app, db_init: DeferredInit, timer: StartupTimer) -> Dict[str, float]:
+    """Precompile templates while the database is set up on another thread."""
+    db_init.start_background()
+    with timer.phase('templates'):
+        precompile_templates(app)
+    db_init.ensure()
+    timer.mark('ready')
+    return timer.report()
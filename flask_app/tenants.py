@@ -0,0 +1,181 @@
+"""Multi-portfolio hosting: one SQLite file (shard) per tenant, chosen by host name or path prefix."""
+import argparse
+import glob
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import DAL
+import metrics
+
+
+SHARD_SUFFIX = '.db'
+# Tenant names double as file names, so keep them to a safe subset
+TENANT_NAME = re.compile(r'^[a-z0-9][a-z0-9-]{0,62}$')
+ENVIRON_KEY = 'projects.tenant'
+DEFAULT_TENANT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tenants')
+
+metrics.registry.describe('db_pool_idle_connections', 'gauge', 'Open SQLite connections waiting for reuse, across all shards')
+metrics.registry.describe('db_pool_connections_opened_total', 'counter', 'SQLite connections opened by the pool')
+
+
+def valid_name(name: str) -> bool:
+    return bool(TENANT_NAME.match(name))
+
+
+def shard_path(tenant_dir: str, tenant: str) -> str:
+    """Return the database file for ``tenant`` inside ``tenant_dir``."""
+    if not valid_name(tenant):
+        raise ValueError(f"Invalid tenant name: {tenant!r}")
+    return os.path.join(tenant_dir, tenant + SHARD_SUFFIX)
+
+
+def create_shard(tenant_dir: str, tenant: str) -> bool:
+    """Create and migrate ``tenant``'s database; return False if it already existed.
+
+    Requests never create shards, so an unknown name cannot leave a file
+    behind; new tenants are added with ``tenants.py create``.
+    """
+    path = shard_path(tenant_dir, tenant)
+    existed = os.path.exists(path)
+    with DAL.use_db_path(path):
+        DAL.ensure_db()
+    return not existed
+
+
+def list_shards(tenant_dir: str) -> List[str]:
+    """Return the names of tenants that have a database in ``tenant_dir``, sorted."""
+    names = (os.path.basename(p)[:-len(SHARD_SUFFIX)] for p in glob.glob(os.path.join(tenant_dir, '*' + SHARD_SUFFIX)))
+    return sorted(name for name in names if valid_name(name))
+
+
+class TenantMiddleware:
+    """WSGI middleware that works out the tenant of each request.
+
+    In ``host`` mode the tenant is the first label of a host ending in
+    ``host_suffix`` (``alice.portfolios.example`` -> ``alice``). In ``path``
+    mode a ``/t/<tenant>`` prefix is moved from ``PATH_INFO`` to
+    ``SCRIPT_NAME``, so routes and ``url_for`` work unchanged under it.
+    The name is stored in ``environ['projects.tenant']``; requests without
+    one are served from the default database. Malformed names, and names
+    missing from ``allowed`` when it is given, get a 404 before Flask runs;
+    the app also answers 404 for valid names that have no shard yet.
+    """
+
+    def __init__(self, app, mode: str, host_suffix: str = '', allowed: Optional[Iterable[str]] = None):
+        if mode not in ('host', 'path'):
+            raise ValueError(f"Unknown tenant mode: {mode!r}")
+        if mode == 'host' and not host_suffix.strip('.'):
+            raise ValueError("Host mode needs a host suffix")
+        self.app = app
+        self.mode = mode
+        self.host_suffix = '.' + host_suffix.strip('.').lower()
+        self.allowed = set(allowed) if allowed else None
+
+    def _from_host(self, environ) -> Optional[str]:
+        host = (environ.get('HTTP_HOST') or environ.get('SERVER_NAME') or '').split(':')[0].lower()
+        # The bare suffix (and unrelated hosts) is the default portfolio
+        if not host.endswith(self.host_suffix):
+            return None
+        return host[:-len(self.host_suffix)]
+
+    def _from_path(self, environ) -> Optional[str]:
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith('/t/'):
+            return None
+        tenant, _, rest = path[3:].partition('/')
+        environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + '/t/' + tenant
+        environ['PATH_INFO'] = '/' + rest
+        return tenant
+
+    def __call__(self, environ, start_response):
+        tenant = self._from_host(environ) if self.mode == 'host' else self._from_path(environ)
+        if tenant is not None:
+            if not valid_name(tenant) or (self.allowed is not None and tenant not in self.allowed):
+                start_response('404 Not Found', [('Content-Type', 'text/plain; charset=utf-8')])
+                return [b'Unknown portfolio\n']
+            environ[ENVIRON_KEY] = tenant
+        return self.app(environ, start_response)
+
+
+def fan_out(tenant_dir: str, func: Callable[[], object], tenants: Optional[List[str]] = None,
+            max_workers: int = 8) -> Dict[str, object]:
+    """Run ``func`` against every shard in parallel and return ``{tenant: result}``.
+
+    Each call runs with the DAL pointed at that tenant's database. A shard
+    that fails does not stop the others; its result is the exception.
+    """
+    names = list_shards(tenant_dir) if tenants is None else tenants
+
+    def run(tenant):
+        with DAL.use_db_path(shard_path(tenant_dir, tenant)):
+            try:
+                return func()
+            except Exception as exc:
+                return exc
+
+    if not names:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(names)), thread_name_prefix='shard') as executor:
+        return dict(zip(names, executor.map(run, names)))
+
+
+def _collect_pool_metrics(registry: metrics.Metrics) -> None:
+    stats = DAL.pool.stats()
+    registry.set('db_pool_idle_connections', stats['idle'])
+    registry.set('db_pool_connections_opened_total', stats['opened'])
+
+
+metrics.registry.register_collector(_collect_pool_metrics)
+
+
+def init_app(app) -> Optional[TenantMiddleware]:
+    """Route requests to per-tenant databases if ``TENANT_MODE`` is ``host`` or ``path``."""
+    mode = app.config.get('TENANT_MODE')
+    if not mode:
+        return None
+    allowed = [name.strip() for name in app.config.get('TENANTS', '').split(',') if name.strip()]
+    middleware = TenantMiddleware(app.wsgi_app, mode, app.config.get('TENANT_HOST_SUFFIX', ''), allowed)
+    app.wsgi_app = middleware
+    app.extensions['tenants'] = middleware
+    return middleware
+
+
+def _main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect and maintain per-tenant project databases.")
+    parser.add_argument("--dir", default=os.environ.get('TENANT_DIR', DEFAULT_TENANT_DIR), help="directory holding the shards")
+    parser.add_argument("--workers", type=int, default=8)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="print the tenants that have a database")
+    create_parser = sub.add_parser("create", help="create and migrate the databases of new tenants")
+    create_parser.add_argument("names", nargs="+")
+    sub.add_parser("stats", help="print the number of projects in every shard")
+    sub.add_parser("migrate", help="bring every shard's schema up to date")
+    search_parser = sub.add_parser("search", help="find projects by title prefix in every shard")
+    search_parser.add_argument("q")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for name in list_shards(args.dir):
+            print(name)
+        return
+    if args.command == "create":
+        for name in args.names:
+            print(f"{name}: {'created' if create_shard(args.dir, name) else 'exists'}")
+        return
+    funcs = {
+        "stats": DAL.count_projects,
+        "migrate": DAL.migrate,
+        "search": lambda: DAL.query_projects(q=args.q, limit=20),
+    }
+    started = time.perf_counter()
+    results = fan_out(args.dir, funcs[args.command], max_workers=args.workers)
+    for tenant, result in results.items():
+        print(f"{tenant}: {result}")
+    print(f"{args.command} over {len(results)} shard(s) finished in {time.perf_counter() - started:.3f}s")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,264 @@
+"""Request tracing: spans for each request, DAL call and template render, exported in batches."""
+import atexit
+import contextvars
+import ipaddress
+import json
+import random
+import re
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+import DAL
+import accesslog
+
+
+SERVICE_NAME = 'flask-portfolio'
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# Span id of the innermost open span in this request, if it is being recorded
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_span', default=None)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """Return ``(trace_id, parent_span_id, sampled)`` from a W3C traceparent header, or None."""
+    match = _TRACEPARENT.match((header or '').strip().lower())
+    if not match:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == '0' * 32 or span_id == '0' * 16:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+def _new_id(nbytes: int) -> str:
+    return f'{random.getrandbits(nbytes * 8):0{nbytes * 2}x}'
+
+
+def should_sample(trace_id: str, rate: float) -> bool:
+    """Decide from the trace id alone, so every service keeps or drops the same traces."""
+    return int(trace_id[-16:], 16) < rate * 2 ** 64
+
+
+class Tracer:
+    """Record spans per request and hand finished traces to ``export``.
+
+    A request continues the trace of an incoming ``traceparent``. Its
+    sampled flag is honoured only when the connection comes straight from
+    ``trusted_upstreams`` (addresses or networks), so a client cannot force every request to be recorded and
+    exported; other requests, and new traces, keep ``sample_rate`` of traces. With
+    ``slow_ms`` set, every request is recorded and traces of requests that
+    took at least that long are exported even if they were not sampled, so
+    the slow outliers behind a p99 regression are always there to look at.
+    """
+
+    def __init__(self, export: Callable[[List[Dict]], None], sample_rate: float = 0.0, slow_ms: float = 0.0,
+                 trusted_upstreams: Iterable[str] = ()):
+        self.export = export
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.trusted_upstreams = [ipaddress.ip_network(net, strict=False) for net in trusted_upstreams]
+
+    def _trusted(self, addr: Optional[str]) -> bool:
+        try:
+            ip = ipaddress.ip_address(addr or '')
+        except ValueError:
+            return False
+        return any(ip in net for net in self.trusted_upstreams)
+
+    def init_app(self, app) -> None:
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        before_render_template.connect(self._start_render, app)
+        template_rendered.connect(self._finish_render, app)
+        DAL.add_call_hook(self.span)
+        app.extensions['tracer'] = self
+
+    # -- spans -----------------------------------------------------------
+
+    def _open(self, name: str, kind: int = KIND_INTERNAL, parent_id: Optional[str] = None, **attributes) -> Dict:
+        span = {
+            'trace_id': g.trace_id,
+            'span_id': _new_id(8),
+            'parent_id': parent_id if parent_id is not None else _current_span.get(),
+            'name': name,
+            'kind': kind,
+            'start_ns': time.time_ns(),
+            'end_ns': None,
+            'attributes': attributes,
+        }
+        g.trace_spans.append(span)
+        return span
+
+    def _recording(self) -> bool:
+        return has_request_context() and g.get('trace_spans') is not None
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Record the ``with`` block as a child of the current span (no-op outside a recorded request)."""
+        if not self._recording():
+            yield None
+            return
+        span = self._open(name, **attributes)
+        token = _current_span.set(span['span_id'])
+        try:
+            yield span
+        except Exception as exc:
+            span['attributes']['error'] = type(exc).__name__
+            raise
+        finally:
+            span['end_ns'] = time.time_ns()
+            _current_span.reset(token)
+
+    # -- Flask hooks -----------------------------------------------------
+
+    def _start_request(self) -> None:
+        parent = parse_traceparent(request.headers.get('traceparent'))
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+            # The immediate peer: behind ProxyFix, remote_addr is already the end client
+            peer = request.environ.get('werkzeug.proxy_fix.orig', {}).get('REMOTE_ADDR', request.remote_addr)
+            if not self._trusted(peer):
+                # The id is kept for correlation; the decision is ours. Not from
+                # the id either, since the caller picked it.
+                sampled = random.random() < self.sample_rate
+        else:
+            trace_id, parent_id = _new_id(16), None
+            sampled = should_sample(trace_id, self.sample_rate)
+        g.trace_id = trace_id
+        g.trace_sampled = sampled
+        g.trace_renders = []
+        # Everything is recorded when slow requests are kept regardless of sampling
+        g.trace_spans = [] if sampled or self.slow_ms else None
+        if g.trace_spans is None:
+            g.trace_root = None
+            return
+        g.trace_root = self._open(f'{request.method} {request.path}', KIND_SERVER, parent_id or '',
+                                  **{'http.method': request.method, 'http.target': request.full_path.rstrip('?')})
+        g.trace_token = _current_span.set(g.trace_root['span_id'])
+
+    def _finish_request(self, response):
+        root = g.get('trace_root')
+        if root is None:
+            return response
+        root['end_ns'] = time.time_ns()
+        _current_span.reset(g.pop('trace_token'))
+        if request.url_rule:
+            # Name by route, not path, so spans group across ids and pages
+            root['name'] = f'{request.method} {request.url_rule.rule}'
+        root['attributes'].update({
+            'http.route': request.url_rule.rule if request.url_rule else None,
+            'http.status_code': response.status_code,
+            'cache.status': g.get('cache_status'),
+        })
+        response.headers['traceparent'] = format_traceparent(g.trace_id, root['span_id'], g.trace_sampled)
+        slow = self.slow_ms and (root['end_ns'] - root['start_ns']) / 1e6 >= self.slow_ms
+        if g.trace_sampled or slow:
+            if slow and not g.trace_sampled:
+                root['attributes']['sampling.reason'] = 'slow'
+            now = time.time_ns()
+            for span in g.trace_spans:
+                if span['end_ns'] is None:
+                    span['end_ns'] = now
+            self.export(g.trace_spans)
+        g.trace_spans = g.trace_root = None
+        return response
+
+    def _start_render(self, sender, template, context, **extra) -> None:
+        if self._recording():
+            span = self._open(f'render {template.name}', template=template.name)
+            g.setdefault('trace_renders', []).append((span, _current_span.set(span['span_id'])))
+
+    def _finish_render(self, sender, template, context, **extra) -> None:
+        renders = g.get('trace_renders')
+        if self._recording() and renders:
+            span, token = renders.pop()
+            span['end_ns'] = time.time_ns()
+            _current_span.reset(token)
+
+
+# -- exporters ---------------------------------------------------------------
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans: List[Dict]) -> Dict:
+    """Convert spans to an OTLP/HTTP JSON ``ExportTraceServiceRequest`` body."""
+    otlp_spans = []
+    for span in spans:
+        otlp = {
+            'traceId': span['trace_id'],
+            'spanId': span['span_id'],
+            'name': span['name'],
+            'kind': span['kind'],
+            'startTimeUnixNano': str(span['start_ns']),
+            'endTimeUnixNano': str(span['end_ns']),
+            'attributes': [
+                {'key': k, 'value': _otlp_value(v)} for k, v in span['attributes'].items() if v is not None
+            ],
+        }
+        if span['parent_id']:
+            otlp['parentSpanId'] = span['parent_id']
+        if 'error' in span['attributes']:
+            otlp['status'] = {'code': 2}
+        otlp_spans.append(otlp)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+        'scopeSpans': [{'scope': {'name': 'tracing'}, 'spans': otlp_spans}],
+    }]}
+
+
+def file_exporter(path: str) -> Callable[[List[List[Dict]]], None]:
+    """Append one JSON line per span to ``path``."""
+    lines = accesslog.file_writer(path)
+
+    def write(traces: List[List[Dict]]) -> None:
+        lines([json.dumps(span, separators=(',', ':')) for spans in traces for span in spans])
+    return write
+
+
+def otlp_exporter(endpoint: str, timeout: float = 5.0) -> Callable[[List[List[Dict]]], None]:
+    """POST each batch of traces to an OTLP/HTTP collector (e.g. ``http://collector:4318/v1/traces``)."""
+    def write(traces: List[List[Dict]]) -> None:
+        body = json.dumps(to_otlp([span for spans in traces for span in spans])).encode()
+        req = urllib.request.Request(endpoint, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+    return write
+
+
+def init_app(app) -> Optional[Tracer]:
+    """Enable tracing if ``TRACE_FILE`` or ``TRACE_OTLP_ENDPOINT`` is set."""
+    if app.config.get('TRACE_OTLP_ENDPOINT'):
+        sink = otlp_exporter(app.config['TRACE_OTLP_ENDPOINT'])
+    elif app.config.get('TRACE_FILE'):
+        sink = file_exporter(app.config['TRACE_FILE'])
+    else:
+        return None
+    # Same bounded, non-blocking batching as the access log; a whole trace is one record
+    writer = accesslog.BatchWriter('traces', sink, max_queue=app.config.get('TRACE_QUEUE_SIZE', 2000),
+                                   batch_size=64, flush_interval=app.config.get('TRACE_FLUSH_INTERVAL', 2.0))
+    atexit.register(writer.close)
+    trusted = [net.strip() for net in app.config.get('TRACE_TRUSTED_UPSTREAMS', '').split(',') if net.strip()]
+    tracer = Tracer(writer.submit, app.config.get('TRACE_SAMPLE_RATE', 0.01), app.config.get('TRACE_SLOW_MS', 0.0), trusted)
+    tracer.init_app(app)
+    return tracer
@@ -0,0 +1,132 @@
+"""
+Tests for the JSON access log and its background batch writer.
+"""
+import io
+import json
+import threading
+
+import pytest
+
+import accesslog
+import metrics
+
+
+def test_batch_writer_batches_and_flushes():
+    """Test that queued records are written in batches on the background thread."""
+    batches = []
+    writer = accesslog.BatchWriter('test', batches.append, batch_size=3, flush_interval=0.05)
+    for i in range(7):
+        assert writer.submit(i)
+    writer.flush()
+    writer.close()
+
+    assert [r for batch in batches for r in batch] == list(range(7))
+    assert all(len(batch) <= 3 for batch in batches)
+
+
+def test_batch_writer_drop_policy_bounds_memory():
+    """Test that a full queue drops records instead of blocking the caller."""
+    release = threading.Event()
+    written = []
+
+    def slow_write(batch):
+        release.wait(5)
+        written.extend(batch)
+
+    writer = accesslog.BatchWriter('test_drop', slow_write, max_queue=2, batch_size=1, flush_interval=0.01)
+    before = metrics.registry.get('log_records_dropped_total', writer='test_drop')
+    writer.submit('first')  # taken by the writer thread, which then stalls
+    while writer._queue.qsize():
+        pass
+    results = [writer.submit(i) for i in range(5)]
+    release.set()
+    writer.close()
+
+    assert results == [True, True, False, False, False]
+    assert writer.dropped == 3
+    assert metrics.registry.get('log_records_dropped_total', writer='test_drop') == before + 3
+    assert written == ['first', 0, 1]
+
+
+def test_batch_writer_block_policy_waits_for_room():
+    """Test that the block policy delays the caller rather than dropping."""
+    gate = threading.Event()
+    written = []
+    writer = accesslog.BatchWriter('test_block', lambda b: (gate.wait(5), written.extend(b)),
+                                   max_queue=1, batch_size=1, flush_interval=0.01, policy='block')
+    writer.submit('a')
+    while writer._queue.qsize():
+        pass
+    writer.submit('b')
+    threading.Timer(0.05, gate.set).start()
+    assert writer.submit('c')
+    writer.close()
+    assert written == ['a', 'b', 'c'] and writer.dropped == 0
+
+    with pytest.raises(ValueError):
+        accesslog.BatchWriter('bad', print, policy='spill')
+
+
+def test_batch_writer_survives_failing_sink():
+    """Test that an exception in the sink does not stop later batches."""
+    calls = []
+
+    def flaky(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise OSError('disk full')
+
+    writer = accesslog.BatchWriter('test_flaky', flaky, batch_size=1, flush_interval=0.01)
+    writer.submit(1)
+    writer.flush()
+    writer.submit(2)
+    writer.close()
+    assert calls == [[1], [2]]
+
+
+@pytest.fixture
+def access_log(app, monkeypatch):
+    """Attach an access log writing JSON lines to a buffer."""
+    buffer = io.StringIO()
+    writer = accesslog.BatchWriter('test_access', accesslog.format_records(accesslog.stream_writer(buffer)),
+                                   flush_interval=0.01)
+    log = accesslog.AccessLog(writer)
+    # Hooks are attached per test, after the app has served requests
+    monkeypatch.setattr(app, '_got_first_request', False)
+    monkeypatch.setattr(app, 'before_request_funcs', {k: list(v) for k, v in app.before_request_funcs.items()})
+    monkeypatch.setattr(app, 'after_request_funcs', {k: list(v) for k, v in app.after_request_funcs.items()})
+    monkeypatch.setattr(accesslog.DAL, '_timing_listeners', [])
+    log.init_app(app)
+    # Like app.py, run after every other after_request hook
+    hooks = app.after_request_funcs[None]
+    hooks.insert(0, hooks.pop())
+
+    def records():
+        writer.flush()
+        return [json.loads(line) for line in buffer.getvalue().splitlines()]
+
+    yield records
+    writer.close()
+
+
+def test_access_log_records_request_fields(client, access_log, populated_database):
+    """Test that each request produces one JSON line with route, status, timing, cache and size."""
+    etag = client.get('/projects').headers['ETag']
+    client.get('/projects', headers={'If-None-Match': etag})
+    client.get('/projects/999999')
+
+    first, second, missing = access_log()
+    assert first['route'] == '/projects' and first['path'] == '/projects'
+    assert first['status'] == 200 and first['method'] == 'GET'
+    assert first['cache'] == 'miss' and second['cache'] == 'hit'
+    assert first['db_calls'] >= 1 and first['db_ms'] > 0
+    assert second['db_calls'] == 0
+    assert second['status'] == 304 and second['bytes'] == 0
+    assert first['bytes'] > 0 and first['latency_ms'] >= first['db_ms']
+    assert missing['route'] == '/projects/<int:project_id>' and missing['status'] == 404
+    assert missing['cache'] is None
+
+
+def test_access_log_disabled_by_default(app):
+    """Test that no access log is configured unless ACCESS_LOG is set."""
+    assert accesslog.init_app(app) is None
@@ -0,0 +1,124 @@
+"""
+Tests for admission control: concurrency limits, load shedding and rate limits.
+"""
+import threading
+import time
+
+import pytest
+
+import admission
+from app import admission_control
+
+
+def test_limiter_queues_then_admits():
+    """Test that a queued request gets the slot once it is released."""
+    limiter = admission.ConcurrencyLimiter('test', max_concurrent=1, max_queue=1, queue_timeout=2)
+    limiter.acquire()
+    admitted = threading.Event()
+
+    def waiter():
+        limiter.acquire()
+        admitted.set()
+        limiter.release()
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    time.sleep(0.05)
+    assert limiter.waiting == 1
+    limiter.release()
+    t.join(2)
+    assert admitted.is_set()
+    assert limiter.active == 0
+
+
+def test_limiter_rejects_when_queue_full():
+    """Test that requests beyond the queue bound are shed immediately."""
+    limiter = admission.ConcurrencyLimiter('test', max_concurrent=1, max_queue=0, queue_timeout=2)
+    limiter.acquire()
+    started = time.monotonic()
+    with pytest.raises(admission.Rejected) as excinfo:
+        limiter.acquire()
+    assert time.monotonic() - started < 0.1
+    assert excinfo.value.status == 503
+    assert excinfo.value.reason == 'queue_full'
+    assert excinfo.value.retry_after >= 1
+
+
+def test_limiter_rejects_when_deadline_cannot_be_met():
+    """Test that a request is rejected up front if the expected wait exceeds its deadline."""
+    limiter = admission.ConcurrencyLimiter('test', max_concurrent=1, max_queue=10, queue_timeout=0.5)
+    limiter.acquire()
+    limiter._service_time = 5.0
+    with pytest.raises(admission.Rejected) as excinfo:
+        limiter.acquire()
+    assert excinfo.value.reason == 'deadline'
+    assert excinfo.value.retry_after >= 5
+
+
+def test_limiter_times_out_queued_request():
+    """Test that a queued request gives up after the queue timeout."""
+    limiter = admission.ConcurrencyLimiter('test', max_concurrent=1, max_queue=1, queue_timeout=0.05)
+    limiter._service_time = 0.001
+    limiter.acquire()
+    with pytest.raises(admission.Rejected) as excinfo:
+        limiter.acquire()
+    assert excinfo.value.reason == 'timeout'
+    assert limiter.waiting == 0
+
+
+def test_rate_limiter_token_bucket():
+    """Test that a client gets its burst, then must wait for refills."""
+    limiter = admission.RateLimiter('test', rate=10, burst=2, max_clients=2)
+    assert limiter.check('a') == 0
+    assert limiter.check('a') == 0
+    assert limiter.check('a') > 0
+    assert limiter.check('b') == 0
+    time.sleep(0.15)
+    assert limiter.check('a') == 0
+
+    limiter.check('c')
+    assert 'b' not in limiter._buckets  # least recently seen client evicted
+
+
+def test_saturated_db_route_returns_fast_503(client, app):
+    """Test that /projects sheds load while static pages stay responsive."""
+    limiter = admission_control.limiters['projects']
+    held = []
+    original_queue = limiter.max_queue
+    try:
+        for _ in range(limiter.max_concurrent):
+            limiter.acquire()
+            held.append(1)
+        limiter.max_queue = 0
+
+        started = time.monotonic()
+        response = client.get('/projects')
+        assert time.monotonic() - started < 0.5
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+
+        about = client.get('/about')
+        assert about.status_code == 200
+
+        scrape = client.get('/metrics').data.decode()
+        assert f'admission_in_flight{{route="projects"}} {limiter.max_concurrent}' in scrape
+        assert 'admission_rejected_total{reason="queue_full",route="projects"}' in scrape
+    finally:
+        limiter.max_queue = original_queue
+        for _ in held:
+            limiter.release()
+
+
+def test_submission_rate_limited_per_client(client, app):
+    """Test that rapid submissions from one IP get 429 with Retry-After."""
+    limiter = admission_control.rate_limiters['add_project']
+    statuses = [
+        client.post('/projects/add', data={'title': f'Spam {i}'}).status_code
+        for i in range(limiter.burst + 1)
+    ]
+    assert statuses[:-1] == [302] * limiter.burst
+    assert statuses[-1] == 429
+
+    other = client.post('/projects/add', data={'title': 'Other'}, environ_base={'REMOTE_ADDR': '10.0.0.9'})
+    assert other.status_code == 302
+    assert client.get('/projects/add').status_code == 200
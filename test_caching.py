@@ -0,0 +1,217 @@
+"""
+Tests for the in-process caches used by the request handlers.
+"""
+import threading
+import time
+
+import pytest
+
+import DAL
+import cache
+from app import project_cache, get_projects_cached
+
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test that the LRU cache stays bounded and keeps recently used keys."""
+    lru = cache.LRUCache(maxsize=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+
+    assert 'b' not in lru
+    assert lru.get('a') == 1
+    assert lru.get('c') == 3
+    assert len(lru) == 2
+    assert lru.get('missing') is None
+    assert (lru.hits, lru.misses) == (3, 1)
+
+
+def test_lru_cache_entries_expire_after_ttl():
+    """Test that entries older than the TTL are dropped, so other workers' deletes are seen."""
+    lru = cache.LRUCache(maxsize=2, ttl=0.01)
+    lru.set('a', 1)
+    assert lru.get('a') == 1
+    time.sleep(0.02)
+    assert 'a' not in lru
+    assert lru.get('a') is None
+    assert lru.pop('a', 'gone') == 'gone'
+
+
+def test_detail_pages_served_from_hot_cache(client, app, sample_project, monkeypatch):
+    """Test that repeat views of a project do not query the database."""
+    project_id = DAL.save_project(sample_project['title'], sample_project['description'])
+    assert client.get(f'/projects/{project_id}').status_code == 200
+
+    def fail(ids):
+        raise AssertionError('database queried for a cached project')
+
+    monkeypatch.setattr(DAL, 'get_projects_by_ids', fail)
+    response = client.get(f'/projects/{project_id}')
+    assert response.status_code == 200
+    assert sample_project['title'].encode() in response.data
+
+
+def test_batched_lookup_fetches_only_misses(app, populated_database, monkeypatch):
+    """Test that cache misses are fetched together in one query."""
+    ids = DAL.get_project_ids()
+    get_projects_cached(ids[:1])
+
+    calls = []
+    original = DAL.get_projects_by_ids
+    monkeypatch.setattr(DAL, 'get_projects_by_ids', lambda wanted: calls.append(wanted) or original(wanted))
+
+    projects = get_projects_cached(ids)
+    assert [p['id'] for p in projects] == ids
+    assert calls == [ids[1:]]
+
+
+def test_delete_evicts_project_from_hot_cache(client, app, sample_project):
+    """Test that deleting a project removes it from the hot-object cache."""
+    project_id = DAL.save_project(sample_project['title'], sample_project['description'])
+    client.get(f'/projects/{project_id}')
+    assert (DAL.get_db_path(), project_id) in project_cache
+
+    DAL.delete_project(project_id)
+
+    assert (DAL.get_db_path(), project_id) not in project_cache
+    assert client.get(f'/projects/{project_id}').status_code == 404
+
+
+def test_single_flight_shares_one_execution():
+    """Test that concurrent calls for one key run the function once."""
+    flight = cache.SingleFlight()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('k', slow))) for _ in range(5)]
+    for t in followers:
+        t.start()
+    time.sleep(0.1)  # let the followers reach the wait
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+
+    assert calls == [1]
+    assert sorted(results) == [('value', False)] + [('value', True)] * 5
+
+
+def test_single_flight_propagates_errors():
+    """Test that the leader's exception is raised and the key is released."""
+    flight = cache.SingleFlight()
+    with pytest.raises(ZeroDivisionError):
+        flight.do('k', lambda: 1 / 0)
+    assert not flight.in_flight('k')
+    assert flight.do('k', lambda: 42) == (42, False)
+
+
+def test_refreshing_cache_serves_stale_while_revalidating():
+    """Test that an expired entry is served while one caller refreshes it."""
+    refreshing = cache.RefreshingCache(ttl=0.01, stale_ttl=60)
+    assert refreshing.get('k', lambda: 'v1') == ('v1', 'miss')
+    assert refreshing.get('k', lambda: 'unused') == ('v1', 'hit')
+    time.sleep(0.02)
+
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_refresh():
+        started.set()
+        release.wait(5)
+        return 'v2'
+
+    results = []
+    refresher = threading.Thread(target=lambda: results.append(refreshing.get('k', slow_refresh)))
+    refresher.start()
+    started.wait(5)
+    assert refreshing.get('k', lambda: 'unused') == ('v1', 'stale')
+    release.set()
+    refresher.join(5)
+
+    assert results == [('v2', 'refreshed')]
+    assert refreshing.get('k', lambda: 'unused') == ('v2', 'hit')
+
+
+def test_refreshing_cache_does_not_keep_loads_that_race_invalidation():
+    """Test that a load started before invalidate() is not cached."""
+    refreshing = cache.RefreshingCache(ttl=60)
+
+    def load_then_invalidate():
+        refreshing.invalidate()
+        return 'old'
+
+    assert refreshing.get('k', load_then_invalidate) == ('old', 'miss')
+    assert refreshing.get('k', lambda: 'new') == ('new', 'miss')
+
+
+def test_callers_after_invalidate_do_not_join_an_older_load():
+    """Test that a write landing while a load is in flight is seen by the next caller."""
+    refreshing = cache.RefreshingCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def slow_pre_write_load():
+        started.set()
+        release.wait(2)
+        return 'pre-write rows'
+
+    t = threading.Thread(target=lambda: results.append(refreshing.get('k', slow_pre_write_load)))
+    t.start()
+    started.wait(2)
+    refreshing.invalidate()  # the write lands mid-load
+    try:
+        assert refreshing.get('k', lambda: 'post-write rows') == ('post-write rows', 'miss')
+    finally:
+        release.set()
+        t.join(2)
+    assert results == [('pre-write rows', 'miss')]
+    assert refreshing.get('k', lambda: 'reloaded') == ('post-write rows', 'hit')
+
+
+def test_concurrent_listing_misses_run_one_query(app, populated_database, monkeypatch):
+    """Test that N concurrent /projects misses produce a single DB query."""
+    calls = []
+    original = DAL.query_projects
+
+    def slow_query(**filters):
+        calls.append(filters)
+        time.sleep(0.2)
+        return original(**filters)
+
+    monkeypatch.setattr(DAL, 'query_projects', slow_query)
+    barrier = threading.Barrier(8)
+    responses = []
+
+    def fetch():
+        client = app.test_client()
+        barrier.wait(5)
+        responses.append(client.get('/projects'))
+
+    threads = [threading.Thread(target=fetch) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+
+    assert len(calls) == 1
+    assert len(responses) == 8
+    assert all(r.status_code == 200 and b'Project 1' in r.data for r in responses)
+
+
+def test_listing_cache_invalidated_by_writes(client, app, populated_database):
+    """Test that a save shows up on the next /projects request."""
+    assert b'Brand New' not in client.get('/projects').data
+    DAL.save_project('Brand New', 'just added', '')
+    assert b'Brand New' in client.get('/projects').data
@@ -0,0 +1,118 @@
+"""
+Tests for the CSS build: minification, selector pruning and critical CSS.
+"""
+import json
+import os
+
+import cssbuild
+
+
+SAMPLE_CSS = """
+/* comment */
+body {
+    color: #333;
+    margin: 0 auto;
+}
+
+.used, .unused {
+    padding: 1rem  2rem;
+}
+
+.hero > h1:hover { color: red; }
+
+@media (max-width: 768px) {
+    .unused { display: none; }
+    .used { padding: 0; }
+}
+
+@keyframes spin { from { transform: rotate(0deg); } to { transform: rotate(360deg); } }
+"""
+
+
+def test_minify_strips_comments_and_whitespace():
+    """Test that minified CSS keeps every rule but drops comments and spacing."""
+    css = cssbuild.minify(SAMPLE_CSS)
+    assert 'comment' not in css
+    assert 'body{color:#333;margin:0 auto}' in css
+    assert '.used,.unused{padding:1rem 2rem}' in css
+    assert '.hero>h1:hover{color:red}' in css
+    assert '@media (max-width:768px){.unused{display:none}.used{padding:0}}' in css
+    assert '@keyframes spin{from{transform:rotate(0deg)}to{transform:rotate(360deg)}}' in css
+
+
+def test_prune_drops_unused_selectors():
+    """Test that selectors naming unused classes are removed, even inside media queries."""
+    used = {'body', '.used', '.hero', 'h1'}
+    css = cssbuild.serialize(cssbuild.prune(cssbuild.parse(SAMPLE_CSS), used))
+    assert '.unused' not in css
+    assert '.used{padding:1rem 2rem}' in css
+    assert '@media (max-width:768px){.used{padding:0}}' in css
+    assert '.hero>h1:hover' in css
+
+    critical = cssbuild.serialize(cssbuild.prune(cssbuild.parse(SAMPLE_CSS), used, drop_interactive=True))
+    assert ':hover' not in critical
+
+
+def test_selector_names():
+    """Test extracting the names a selector depends on."""
+    assert cssbuild.selector_names('nav a.active') == {'nav', 'a', '.active'}
+    assert cssbuild.selector_names('.skill-category li::before') == {'.skill-category', 'li'}
+    assert cssbuild.selector_names('.projects-table td:nth-child(2)') == {'.projects-table', 'td'}
+
+
+def test_above_the_fold_covers_header_and_first_section():
+    """Test that critical names come from the header and the first content element only."""
+    names = cssbuild.above_the_fold_names('index.html')
+    assert {'header', '.logo', 'nav', '.active', '.hero', '.hero-image', 'img'} <= names
+    assert '.skills-grid' not in names  # further down the page
+
+
+def test_build_writes_stylesheet_critical_css_and_report(tmp_path):
+    """Test a full build against the real stylesheet and templates."""
+    out_dir = str(tmp_path / 'build')
+    manifest = cssbuild.build(out_dir)
+
+    report = manifest['report']
+    assert report['pruned_bytes'] < report['minified_bytes'] < report['source_bytes']
+    with open(os.path.join(out_dir, 'manifest.json')) as f:
+        assert json.load(f)['version'] == manifest['version']
+    assert os.path.exists(os.path.join(out_dir, cssbuild.STYLESHEET_NAME))
+
+    index = manifest['critical']['index.html']
+    assert index['bytes'] < report['pruned_bytes']
+    with open(os.path.join(out_dir, index['file'])) as f:
+        critical = f.read()
+    assert '.hero-image img{' in critical
+    assert '.skills-grid' not in critical
+    assert 'critical index.html' in cssbuild.format_report(manifest)
+
+
+def test_pages_inline_critical_css_when_built(client, app, tmp_path, monkeypatch):
+    """Test that pages inline critical CSS and load the rest asynchronously once built."""
+    assert b'<link rel="stylesheet" type="text/css" href="/static/styles.css">' in client.get('/about').data
+
+    assets = app.extensions['css_assets']
+    monkeypatch.setattr(assets, 'build_dir', str(tmp_path / 'static' / 'build'))
+    manifest = cssbuild.build(assets.build_dir)
+
+    html = client.get('/about').data.decode()
+    assert '<style>*{margin:0' in html
+    assert f'href="/static/build/styles.min.css?v={manifest["version"]}" as="style"' in html
+    assert '<noscript><link rel="stylesheet"' in html
+    assert 'href="/static/styles.css"' not in html
+
+
+def test_build_outside_the_static_folder_is_served(client, app, tmp_path, monkeypatch):
+    """Test that a build kept out of static/ (clear of a bind mount) is still linked and served."""
+    assets = app.extensions['css_assets']
+    monkeypatch.setattr(assets, 'build_dir', str(tmp_path / 'css-build'))
+    manifest = cssbuild.build(assets.build_dir)
+
+    url = f'/static/build/{manifest["stylesheet"]}?v={manifest["version"]}'
+    assert f'href="{url}"'.encode() in client.get('/about').data
+    response = client.get(url)
+    assert response.status_code == 200
+    with open(os.path.join(assets.build_dir, manifest['stylesheet']), 'rb') as f:
+        assert response.data == f.read()
+    response.close()
+    assert client.get('/static/styles.css').status_code == 200
@@ -3,6 +3,7 @@ Tests for database operations and data access layer.
 """
 import pytest
 import sqlite3
+import datetime
 import os
 import DAL
 
@@ -201,3 +202,224 @@ def test_database_isolation(app):
     projects = DAL.get_all_projects()
     assert len(projects) == 0
 
+
+def test_schema_version_is_latest_after_init(app):
+    """Test that init_db brings the schema to the latest migration."""
+    assert DAL.get_schema_version() == DAL.SCHEMA_VERSION
+
+
+def test_migrate_is_idempotent(app):
+    """Test that running migrations again applies nothing."""
+    assert DAL.migrate() == []
+    DAL.init_db()
+    assert DAL.get_schema_version() == DAL.SCHEMA_VERSION
+
+
+def test_migration_indexes_exist(app):
+    """Test that the sorting/filtering indexes are created."""
+    conn = sqlite3.connect(DAL.get_db_path())
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='projects';")
+    indexes = {row[0] for row in cursor.fetchall()}
+    conn.close()
+
+    assert 'idx_projects_created_at' in indexes
+    assert 'idx_projects_title_nocase' in indexes
+
+
+def test_migrate_upgrades_legacy_database(tmp_path):
+    """Test that a database created before migrations existed is upgraded in place."""
+    db_path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE projects (id INTEGER PRIMARY KEY AUTOINCREMENT, Title TEXT NOT NULL, "
+        "Description TEXT, ImageFileName TEXT, CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP);"
+    )
+    conn.execute("INSERT INTO projects (Title, Description, ImageFileName) VALUES ('Old', 'kept', '');")
+    conn.commit()
+    conn.close()
+
+    with DAL.use_db_path(db_path):
+        assert DAL.migrate(target=1) == [1]
+        assert DAL.get_schema_version() == 1
+        assert DAL.migrate() == list(range(2, DAL.SCHEMA_VERSION + 1))
+        assert [p['Title'] for p in DAL.get_all_projects()] == ['Old']
+
+
+def test_failed_migration_rolls_back(app, monkeypatch):
+    """Test that a failing migration leaves the schema version and tables untouched."""
+    version = DAL.get_schema_version()
+    broken = (version + 1, "broken", [
+        "CREATE TABLE half_done (id INTEGER);",
+        "THIS IS NOT SQL;",
+    ])
+    monkeypatch.setattr(DAL, 'MIGRATIONS', DAL.MIGRATIONS + [broken])
+    monkeypatch.setattr(DAL, 'SCHEMA_VERSION', version + 1)
+
+    with pytest.raises(sqlite3.OperationalError):
+        DAL.migrate()
+
+    assert DAL.get_schema_version() == version
+    conn = sqlite3.connect(DAL.get_db_path())
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE name='half_done';")
+    assert cursor.fetchone() is None
+    conn.close()
+
+
+def _seed_projects(count):
+    """Bulk-insert ``count`` projects spread over January 2025."""
+    conn = sqlite3.connect(DAL.get_db_path())
+    conn.executemany(
+        "INSERT INTO projects (Title, Description, ImageFileName, CreatedAt) VALUES (?,?,?,?)",
+        [
+            (f"Project {i}", "seeded", "", f"2025-01-{i % 28 + 1:02d} 12:00:00")
+            for i in range(count)
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'sort': 'newest'},
+    {'sort': 'created'},
+    {'sort': 'title'},
+    {'q': 'project 1'},
+    {'q': 'project 1', 'sort': 'title'},
+    {'created_from': datetime.date(2025, 1, 5)},
+    {'created_from': datetime.date(2025, 1, 5), 'created_to': datetime.date(2025, 1, 11)},
+    {'created_to': datetime.date(2025, 1, 11), 'sort': 'created'},
+])
+def test_listing_queries_avoid_full_scans(app, filters):
+    """Test that sorted and filtered listings are served from an index."""
+    _seed_projects(2000)
+    sql, params = DAL.build_projects_query(limit=50, **filters)
+
+    conn = sqlite3.connect(DAL.get_db_path())
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    conn.close()
+
+    assert plan
+    for step in plan:
+        assert step != 'SCAN projects', plan
+    if 'q' not in filters or filters.get('sort') == 'title':
+        assert not any('TEMP B-TREE' in step for step in plan), plan
+
+
+def test_query_projects_filters_and_sorts(app):
+    """Test title prefix search, date ranges and sort orders."""
+    _seed_projects(56)
+    DAL.save_project("apple pie", "", "")
+    DAL.save_project("Apricot", "", "")
+
+    titles = [p['Title'] for p in DAL.query_projects(q='ap', sort='title')]
+    assert titles == ['apple pie', 'Apricot']
+
+    # Percent/underscore in the search term are matched literally
+    assert DAL.query_projects(q='%') == []
+
+    january_first = DAL.query_projects(
+        created_from=datetime.date(2025, 1, 1), created_to=datetime.date(2025, 1, 1)
+    )
+    assert len(january_first) == 2
+    assert all(p['CreatedAt'].startswith('2025-01-01') for p in january_first)
+
+    page = DAL.query_projects(sort='created', limit=10, offset=10)
+    assert len(page) == 10
+
+
+def test_query_projects_rejects_unknown_sort(app):
+    """Test that sort orders are whitelisted."""
+    with pytest.raises(ValueError):
+        DAL.query_projects(sort='id; DROP TABLE projects')
+
+
+def test_deleted_projects_are_hidden_everywhere(app):
+    """Test that a tombstoned project drops out of lookups, listings, counts and the fingerprint."""
+    keep = DAL.save_project("Keep", "", "")
+    gone = DAL.save_project("Gone", "", "")
+    before = DAL.get_projects_fingerprint()
+
+    DAL.delete_project(gone)
+
+    assert DAL.get_project_by_id(gone) is None
+    assert [p['id'] for p in DAL.get_projects_by_ids([gone, keep])] == [keep]
+    assert [p['id'] for p in DAL.get_all_projects()] == [keep]
+    assert DAL.get_project_ids() == [keep]
+    assert [p['id'] for p in DAL.query_projects(q='Go')] == []
+    assert DAL.count_projects() == 1
+    assert DAL.get_projects_fingerprint() != before
+
+    # The row is still there until purged
+    conn = sqlite3.connect(DAL.get_db_path())
+    assert conn.execute("SELECT DeletedAt IS NOT NULL FROM projects WHERE id=?;", (gone,)).fetchone() == (1,)
+    conn.close()
+
+
+def test_restore_project(app):
+    """Test that a deleted project can be restored until it is purged."""
+    project_id = DAL.save_project("Oops", "", "")
+    fingerprint = DAL.get_projects_fingerprint()
+    DAL.delete_project(project_id)
+
+    assert DAL.restore_project(project_id) is True
+    assert DAL.get_project_by_id(project_id)['Title'] == "Oops"
+    assert DAL.get_projects_fingerprint() == fingerprint
+    assert DAL.restore_project(project_id) is False
+
+    DAL.delete_project(project_id)
+    DAL.purge_deleted()
+    assert DAL.restore_project(project_id) is False
+
+
+def test_delete_projects_in_bulk(app):
+    """Test that bulk deletes tombstone each live id once and notify per project."""
+    ids = [DAL.save_project(f"Bulk {i}", "", "") for i in range(5)]
+    DAL.delete_project(ids[0])
+    events = []
+    listener = lambda event, project_id: events.append((event, project_id))
+    DAL.add_change_listener(listener)
+    try:
+        assert DAL.delete_projects(ids[:3] + [ids[1], 99999]) == 2
+    finally:
+        DAL.remove_change_listener(listener)
+
+    assert sorted(events) == [('delete', ids[1]), ('delete', ids[2])]
+    assert DAL.get_project_ids() == [ids[4], ids[3]]
+    assert DAL.delete_projects([]) == 0
+
+
+def test_purge_deleted_in_batches(app):
+    """Test that the purge honours the retention period, works in batches and stops when asked."""
+    ids = [DAL.save_project(f"Old {i}", "", "") for i in range(7)]
+    recent = DAL.save_project("Recent", "", "")
+    DAL.delete_projects(ids + [recent])
+    conn = sqlite3.connect(DAL.get_db_path())
+    conn.execute("UPDATE projects SET DeletedAt = datetime('now', '-2 days') WHERE id != ?;", (recent,))
+    conn.commit()
+
+    stop_after_one_batch = iter([False, True])
+    assert DAL.purge_deleted(86400, batch_size=3, should_stop=lambda: next(stop_after_one_batch)) == 3
+    assert DAL.purge_deleted(86400, batch_size=3) == 4
+    remaining = [row[0] for row in conn.execute("SELECT id FROM projects;")]
+    conn.close()
+    assert remaining == [recent]
+
+
+def test_listings_use_partial_indexes(app):
+    """Test that the listing indexes leave tombstones out and are still chosen by the planner."""
+    conn = sqlite3.connect(DAL.get_db_path())
+    partial = {
+        name: sql for name, sql in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name='projects' AND sql IS NOT NULL;"
+        )
+    }
+    sql, params = DAL.build_projects_query(sort='title', limit=10)
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    conn.close()
+
+    assert 'WHERE DeletedAt IS NULL' in partial['idx_projects_title_nocase']
+    assert 'WHERE DeletedAt IS NULL' in partial['idx_projects_created_at']
+    assert any('idx_projects_title_nocase' in step for step in plan), plan
@@ -0,0 +1,139 @@
+"""
+Tests for the static site export ("freeze") mode.
+"""
+import gzip
+import json
+import os
+
+import DAL
+import freeze
+from app import project_cache
+
+
+def test_full_export_writes_pages_assets_and_manifest(app, populated_database, tmp_path):
+    """Test that a full export renders every route and copies static assets."""
+    out_dir = str(tmp_path / 'site')
+    result = freeze.export(app, out_dir, full=True)
+
+    for name in ['index.html', 'about.html', 'resume.html', 'contact.html', 'thankyou.html', 'projects.html']:
+        assert os.path.exists(os.path.join(out_dir, name))
+        assert os.path.exists(os.path.join(out_dir, name + '.gz'))
+    assert os.path.exists(os.path.join(out_dir, 'static', 'styles.css.gz'))
+    assert not os.path.exists(os.path.join(out_dir, 'static', 'images', 'Headshot.jpg.gz'))
+
+    with open(os.path.join(out_dir, 'projects.html.gz'), 'rb') as f:
+        assert b'Project 1' in gzip.decompress(f.read())
+
+    manifest = freeze.load_manifest(out_dir)
+    assert manifest['pages']['/projects']['depends_on'] == ['projects']
+    assert manifest['pages']['/about']['depends_on'] == []
+    assert 'static/styles.css' in manifest['assets']
+    assert set(result['rendered']) == set(manifest['pages'])
+
+
+def test_incremental_export_skips_unchanged_data(app, populated_database, tmp_path):
+    """Test that re-exporting without DB writes renders nothing."""
+    out_dir = str(tmp_path / 'site')
+    freeze.export(app, out_dir)
+    result = freeze.export(app, out_dir)
+    assert result['rendered'] == []
+    assert result['written'] == []
+
+
+def test_incremental_export_rerenders_only_listing_pages(app, populated_database, tmp_path):
+    """Test that a DB write only regenerates the pages that depend on projects."""
+    out_dir = str(tmp_path / 'site')
+    freeze.export(app, out_dir)
+    about_mtime = os.path.getmtime(os.path.join(out_dir, 'about.html'))
+
+    project_id = DAL.save_project('Fresh Project', 'Added after export', '')
+    result = freeze.export(app, out_dir)
+
+    assert result['rendered'] == ['/projects', f'/projects/{project_id}']
+    assert result['written'] == ['projects.html', f'projects/{project_id}.html']
+    assert os.path.getmtime(os.path.join(out_dir, 'about.html')) == about_mtime
+    with open(os.path.join(out_dir, 'projects.html'), 'rb') as f:
+        assert b'Fresh Project' in f.read()
+
+
+def test_incremental_export_adds_and_removes_listing_pages(app, populated_database, tmp_path):
+    """Test that listing pages follow the number of projects."""
+    out_dir = str(tmp_path / 'site')
+    app.config['PROJECTS_PAGE_SIZE'] = 2
+    try:
+        result = freeze.export(app, out_dir)
+        assert 'projects/page/2.html' in result['written']
+
+        deleted = [p['id'] for p in DAL.get_all_projects()[:2]]
+        for project_id in deleted:
+            DAL.delete_project(project_id)
+        result = freeze.export(app, out_dir)
+    finally:
+        app.config['PROJECTS_PAGE_SIZE'] = 50
+
+    assert sorted(result['removed']) == sorted(
+        ['projects/page/2.html'] + [f'projects/{project_id}.html' for project_id in deleted]
+    )
+    assert not os.path.exists(os.path.join(out_dir, 'projects', 'page', '2.html'))
+    with open(os.path.join(out_dir, freeze.MANIFEST_NAME)) as f:
+        assert '/projects/page/2' not in json.load(f)['pages']
+
+
+def test_auto_exporter_runs_after_writes(app, tmp_path):
+    """Test that DAL writes trigger a debounced re-export."""
+    out_dir = str(tmp_path / 'site')
+    freeze.export(app, out_dir)
+    exporter = freeze.AutoExporter(app, out_dir, delay=0.01)
+    exporter.start()
+    try:
+        DAL.save_project('First', '', '')
+        DAL.save_project('Second', '', '')
+        timer = exporter._timer
+        timer.join(5)
+    finally:
+        exporter.stop()
+
+    assert exporter.last_result['rendered'][0] == '/projects'
+    with open(os.path.join(out_dir, 'projects.html'), 'rb') as f:
+        html = f.read()
+    assert b'First' in html and b'Second' in html
+
+
+def test_export_includes_project_detail_pages(app, populated_database, tmp_path):
+    """Test that every project gets its own exported detail page."""
+    out_dir = str(tmp_path / 'site')
+    freeze.export(app, out_dir)
+
+    for project in DAL.get_all_projects():
+        path = os.path.join(out_dir, 'projects', f"{project['id']}.html")
+        with open(path, 'rb') as f:
+            assert project['Title'].encode() in f.read()
+
+
+def test_detail_export_reads_the_dal_directly(app, populated_database, tmp_path):
+    """Test that detail pages match what the app serves without going through its hot-object cache."""
+    project_cache.clear()
+    out_dir = str(tmp_path / 'site')
+    freeze.export(app, out_dir)
+    assert len(project_cache) == 0
+
+    project_id = DAL.get_project_ids()[0]
+    with open(os.path.join(out_dir, 'projects', f'{project_id}.html'), 'rb') as f:
+        assert f.read() == app.test_client().get(f'/projects/{project_id}').data
+
+
+def test_incremental_export_rerenders_everything_after_a_deploy(app, populated_database, tmp_path, monkeypatch):
+    """Test that changed templates, static files or CSS build re-render pages an incremental export would skip."""
+    build_dir = tmp_path / 'css-build'
+    build_dir.mkdir()
+    monkeypatch.setattr(app.extensions['css_assets'], 'build_dir', str(build_dir))
+    out_dir = str(tmp_path / 'site')
+    freeze.export(app, out_dir)
+    assert freeze.export(app, out_dir)['rendered'] == []
+
+    (build_dir / 'styles.min.css').write_text('body{color:red}')
+    result = freeze.export(app, out_dir)
+    assert '/about' in result['rendered'] and '/projects' in result['rendered']
+    assert 'about.html' not in result['written']
+    assert 'static/build/styles.min.css' in freeze.load_manifest(out_dir)['assets']
+    assert freeze.export(app, out_dir)['rendered'] == []
@@ -0,0 +1,62 @@
+"""
+Tests for preload Link headers and hero image dimensions.
+"""
+import os
+import re
+
+import pytest
+
+import hints
+
+
+STATIC_DIR = hints.STATIC_DIR
+
+
+def test_image_size_reads_jpeg_dimensions():
+    """Test reading the pixel size from a JPEG header."""
+    width, height = hints.image_size(os.path.join(STATIC_DIR, 'images', 'Headshot.jpg'))
+    assert width > 0 and height > 0
+
+
+def test_image_size_png_and_other(tmp_path):
+    """Test reading a PNG header and rejecting unknown formats."""
+    png = tmp_path / 'x.png'
+    png.write_bytes(b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x00\rIHDR' + (640).to_bytes(4, 'big') + (480).to_bytes(4, 'big'))
+    assert hints.image_size(str(png)) == (640, 480)
+    other = tmp_path / 'x.txt'
+    other.write_bytes(b'not an image at all, really')
+    assert hints.image_size(str(other)) is None
+
+
+def test_scan_templates_finds_hero_images():
+    """Test that the generated manifest lists above-the-fold images only."""
+    manifest = hints.scan_templates()
+    assert manifest['index.html'] == [{'href': '/static/images/Headshot.jpg', 'as': 'image'}]
+    assert manifest['projects.html'] == [{'href': '/static/images/Lab_pic.jpg', 'as': 'image'}]
+    # The detail page image comes from the database, so it cannot be preloaded
+    assert manifest['project_detail.html'] == []
+
+
+@pytest.mark.parametrize('template', ['index.html', 'projects.html'])
+def test_hero_images_declare_intrinsic_size(template):
+    """Test that hero <img> tags carry width/height matching the image file."""
+    with open(os.path.join(hints.cssbuild.TEMPLATES_DIR, template)) as f:
+        source = f.read()
+    for resource in hints.scan_templates()[template]:
+        tag = re.search(r'<img src="%s"[^>]*>' % re.escape(resource['href']), source).group(0)
+        declared = tuple(int(re.search(r'%s="(\d+)"' % attr, tag).group(1)) for attr in ('width', 'height'))
+        path = os.path.join(STATIC_DIR, *resource['href'][len('/static/'):].split('/'))
+        assert declared == hints.image_size(path)
+
+
+def test_pages_send_preload_link_headers(client):
+    """Test that HTML pages send Link preload headers, including when served from cache."""
+    for _ in range(2):
+        response = client.get('/projects')
+        link = response.headers['Link']
+        assert '</static/styles.css>; rel=preload; as=style' in link
+        assert '</static/images/Lab_pic.jpg>; rel=preload; as=image' in link
+
+    assert client.get('/about').headers['Link'] == '</static/styles.css>; rel=preload; as=style'
+    assert 'Link' not in client.get('/static/styles.css').headers
+    assert 'Link' not in client.get('/does-not-exist').headers
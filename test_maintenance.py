@@ -0,0 +1,156 @@
+"""
+Tests for online backups, database upkeep and the maintenance scheduler.
+"""
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+
+import DAL
+import maintenance
+import metrics
+import tenants
+
+
+def _count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT count(*) FROM projects;").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_backup_copies_live_database(app, populated_database, tmp_path):
+    """Test that an online backup contains every row."""
+    dest = str(tmp_path / 'backup.db')
+    result = maintenance.backup(dest, pages=1, sleep=0)
+
+    assert os.path.exists(dest)
+    assert not os.path.exists(dest + '.tmp')
+    assert result['steps'] >= 1
+    assert _count_rows(dest) == len(populated_database)
+
+
+def test_backup_does_not_block_readers(app, populated_database, tmp_path):
+    """Test that the database can be read while maintenance.backup is running."""
+    for i in range(40):
+        DAL.save_project(f"Bulky {i}", "x" * 4000, "")
+    expected = DAL.count_projects()
+    result = {}
+    # The backup thread runs in this test's context so it copies the same database
+    ctx = contextvars.copy_context()
+    backup_thread = threading.Thread(
+        target=ctx.run,
+        args=(lambda: result.update(maintenance.backup(str(tmp_path / 'live.db'), pages=1, sleep=0.01)),),
+    )
+    backup_thread.start()
+
+    reads_during_backup = 0
+    while backup_thread.is_alive():
+        started = time.perf_counter()
+        assert DAL.count_projects() == expected
+        assert time.perf_counter() - started < 0.5
+        reads_during_backup += 1
+        time.sleep(0.005)
+    backup_thread.join()
+
+    assert result['steps'] > 1
+    assert reads_during_backup > 1
+    with DAL.use_db_path(str(tmp_path / 'live.db')):
+        assert DAL.count_projects() == expected
+    DAL.pool.close_all()
+
+
+def test_snapshot_prunes_old_backups(app, populated_database, tmp_path):
+    """Test that only the newest snapshots are kept."""
+    backup_dir = str(tmp_path / 'snapshots')
+    paths = [maintenance.snapshot(backup_dir, keep=2, sleep=0) for _ in range(4)]
+
+    remaining = sorted(os.listdir(backup_dir))
+    assert len(remaining) == 2
+    assert [os.path.join(backup_dir, name) for name in remaining] == paths[-2:]
+
+
+def test_incremental_vacuum_reclaims_deleted_pages(app):
+    """Test that pages freed by purging deleted projects are returned by an incremental vacuum."""
+    ids = [DAL.save_project(f"Bulky {i}", "x" * 4000, "") for i in range(50)]
+    DAL.delete_projects(ids)
+    assert DAL.purge_deleted(batch_size=20) == 50
+    maintenance.checkpoint('TRUNCATE')
+
+    assert maintenance.db_stats()['freelist_pages'] > 0
+    freed = maintenance.incremental_vacuum()
+    assert freed > 0
+    assert maintenance.db_stats()['freelist_pages'] == 0
+
+
+def test_checkpoint_and_analyze(app, populated_database):
+    """Test that checkpoints and ANALYZE run against the live database."""
+    result = maintenance.checkpoint('TRUNCATE')
+    assert result['busy'] == 0
+    maintenance.analyze()
+    assert maintenance.db_stats()['wal_size_bytes'] == 0
+
+
+def test_scheduler_runs_due_tasks_and_records_metrics():
+    """Test that due tasks run and their timings and failures are recorded."""
+    registry = metrics.Metrics()
+    scheduler = maintenance.MaintenanceScheduler(registry)
+    calls = []
+    scheduler.add_task('ok_task', 3600, lambda: calls.append('ok'), run_at_start=True)
+    scheduler.add_task('bad_task', 3600, lambda: 1 / 0, run_at_start=True)
+    scheduler.add_task('later_task', 3600, lambda: calls.append('later'))
+
+    assert scheduler.run_pending() == ['ok_task', 'bad_task']
+    assert calls == ['ok']
+    assert scheduler.run_pending() == []
+    assert registry.get('db_maintenance_runs_total', task='ok_task', status='ok') == 1
+    assert registry.get('db_maintenance_runs_total', task='bad_task', status='error') == 1
+    assert 'db_maintenance_last_duration_seconds{task="ok_task"}' in registry.render()
+
+
+def test_metrics_endpoint_reports_db_size(client):
+    """Test that /metrics exposes the database size gauges."""
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert b'db_size_bytes ' in response.data
+    assert b'db_freelist_pages ' in response.data
+
+
+def test_tombstone_purge_waits_for_a_quiet_period(app):
+    """Test that the scheduled purge does nothing while the app reports it is busy."""
+    project_id = DAL.save_project("Deleted", "", "")
+    DAL.delete_project(project_id)
+    busy = [True]
+    scheduler = maintenance.default_scheduler({'PURGE_DELETED_AFTER': 0}, is_busy=lambda: busy[0])
+    task = next(t for t in scheduler._tasks if t['name'] == 'purge_deleted')
+
+    scheduler.run_task(task)
+    assert DAL.restore_project(project_id) is True
+
+    DAL.delete_project(project_id)
+    busy[0] = False
+    scheduler.run_task(task)
+    assert DAL.restore_project(project_id) is False
+
+
+def test_tombstone_purge_covers_tenant_shards(app, tmp_path):
+    """Test that the scheduled purge also clears deleted projects in every tenant shard."""
+    tenant_dir = str(tmp_path / 'tenants')
+    deleted = {}
+    for name in ('alice', 'bob'):
+        with DAL.use_db_path(tenants.shard_path(tenant_dir, name)):
+            DAL.ensure_db()
+            deleted[name] = DAL.save_project(f"{name} deleted", "", "")
+            DAL.delete_project(deleted[name])
+    config = {'PURGE_DELETED_AFTER': 0, 'TENANT_MODE': 'path', 'TENANT_DIR': tenant_dir}
+    scheduler = maintenance.default_scheduler(config, is_busy=lambda: False)
+    task = next(t for t in scheduler._tasks if t['name'] == 'purge_deleted')
+
+    scheduler.run_task(task)
+    for name, project_id in deleted.items():
+        with DAL.use_db_path(tenants.shard_path(tenant_dir, name)):
+            assert DAL.restore_project(project_id) is False
+    DAL.pool.close_all()
@@ -0,0 +1,117 @@
+"""
+Tests for allocation tracking and peak-memory budgets on the listing path.
+"""
+import sqlite3
+import tracemalloc
+
+import pytest
+
+import DAL
+import memprofile
+import metrics
+
+LARGE_TABLE_ROWS = 100_000
+
+
+@pytest.fixture(scope='session')
+def large_template(tmp_path_factory):
+    """A migrated database holding LARGE_TABLE_ROWS projects, kept in memory for cloning."""
+    path = str(tmp_path_factory.mktemp('large') / 'large.db')
+    with DAL.use_db_path(path):
+        DAL.init_db()
+    disk = sqlite3.connect(path)
+    disk.executemany(
+        "INSERT INTO projects (Title, Description, ImageFileName) VALUES (?,?,?)",
+        ((f"Project {i}", "A seeded project description of moderate length.", "image.jpg")
+         for i in range(LARGE_TABLE_ROWS)),
+    )
+    disk.commit()
+    memory = sqlite3.connect(':memory:', check_same_thread=False)
+    disk.backup(memory)
+    disk.close()
+    yield memory
+    memory.close()
+
+
+@pytest.fixture
+def large_database(app, large_template):
+    """The test's database replaced by a copy of the large template."""
+    dest = sqlite3.connect(DAL.get_db_path())
+    large_template.backup(dest)
+    dest.close()
+    DAL.pool.close_all()
+    return LARGE_TABLE_ROWS
+
+
+@pytest.fixture
+def profiler(app, monkeypatch):
+    """Attach a memory profiler to the app for this test only."""
+    profiler = memprofile.MemoryProfiler(top=5)
+    # Hooks are attached per test, after the app has served requests
+    monkeypatch.setattr(app, '_got_first_request', False)
+    monkeypatch.setattr(app, 'before_request_funcs', {k: list(v) for k, v in app.before_request_funcs.items()})
+    monkeypatch.setattr(app, 'teardown_request_funcs', {k: list(v) for k, v in app.teardown_request_funcs.items()})
+    monkeypatch.setattr(metrics.registry, '_collectors', list(metrics.registry._collectors))
+    monkeypatch.setitem(app.extensions, 'memory_profiler', None)
+    profiler.init_app(app)
+    yield profiler
+    tracemalloc.stop()
+
+
+def _peak(func):
+    """Return ``(result, peak bytes allocated while func ran)``."""
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+
+
+def test_debug_endpoint_is_off_by_default(client):
+    """Test that the memory report is only served in profiling mode."""
+    assert client.get('/debug/memory').status_code == 404
+
+
+def test_profiler_records_peaks_per_route(client, profiler, populated_database):
+    """Test that each route's peak and top allocation sites are reported and exported."""
+    client.get('/projects')
+    client.get(f"/projects/{DAL.get_project_ids()[0]}")
+    client.get('/about')
+
+    report = client.get('/debug/memory?top=3').get_json()
+    projects = report['routes']['/projects']
+    assert projects['requests'] == 1
+    assert projects['peak_bytes'] > 0
+    assert projects['peak_bytes'] >= projects['last_peak_bytes']
+    assert projects['top'] and all(':' in site['site'] for site in projects['top'])
+    assert '/about' in report['routes'] and '/projects/<int:project_id>' in report['routes']
+    assert len(report['top']) == 3
+    assert report['peak_bytes'] >= report['traced_bytes'] > 0
+
+    body = metrics.registry.render()
+    assert 'request_peak_memory_bytes{route="/projects"}' in body
+    assert 'tracemalloc_traced_bytes' in body
+
+
+def test_get_all_projects_peak_memory(large_database):
+    """Test that a 100k-row read builds each row once (straight into a dict)."""
+    projects, peak = _peak(DAL.get_all_projects)
+    assert len(projects) == large_database
+    # One dict per row is ~50 MB here; also building sqlite3.Row objects first cost ~64 MB
+    assert peak < 56 * 1024 * 1024, peak
+
+
+def test_iter_projects_peak_memory_is_constant(large_database):
+    """Test that streaming the 100k-row table only holds one batch at a time."""
+    count, peak = _peak(lambda: sum(1 for _ in DAL.iter_projects(batch_size=500)))
+    assert count == large_database
+    assert peak < 2 * 1024 * 1024, peak
+
+
+def test_projects_page_peak_memory(client, profiler, large_database):
+    """Test that a listing page over 100k rows costs about the same as over a few."""
+    response = client.get('/projects')
+    assert response.status_code == 200
+    assert profiler.routes['/projects']['peak_bytes'] < 4 * 1024 * 1024
@@ -0,0 +1,55 @@
+"""
+Tests for X-Accel-Redirect file offloading and conditional HTML responses.
+"""
+import pytest
+
+
+def test_resume_download_served(client):
+    """Test that the resume linked from /resume can be downloaded."""
+    response = client.get('/files/Ankush_Nehra_Resume.pdf')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert response.data.startswith(b'%PDF')
+    assert 'X-Accel-Redirect' not in response.headers
+
+
+def test_accel_redirect_offloads_files(client, app, monkeypatch):
+    """Test that with offloading on, file routes return only an X-Accel-Redirect."""
+    monkeypatch.setitem(app.config, 'ACCEL_REDIRECT_PREFIX', '/_accel')
+
+    response = client.get('/static/images/Lab_pic.jpg')
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == '/_accel/static/images/Lab_pic.jpg'
+    assert response.mimetype == 'image/jpeg'
+    assert response.data == b''
+
+    response = client.get('/files/Ankush_Nehra_Resume.pdf')
+    assert response.headers['X-Accel-Redirect'] == '/_accel/files/Ankush_Nehra_Resume.pdf'
+    assert response.data == b''
+
+
+@pytest.mark.parametrize('path', ['/static/missing.css', '/static/../app.py', '/files/../flask_app/app.py'])
+def test_accel_redirect_rejects_missing_and_unsafe_paths(client, app, monkeypatch, path):
+    """Test that nginx is never pointed at files outside the shared directories."""
+    monkeypatch.setitem(app.config, 'ACCEL_REDIRECT_PREFIX', '/_accel')
+    response = client.get(path)
+    assert response.status_code == 404
+    assert 'X-Accel-Redirect' not in response.headers
+
+
+def test_html_pages_are_conditional(client, populated_database):
+    """Test that HTML pages carry an ETag and revalidate with 304."""
+    response = client.get('/projects')
+    etag = response.headers['ETag']
+    revalidated = client.get('/projects', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+    client.post('/projects/add', data={'title': 'Changes the page'})
+    assert client.get('/projects', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_non_html_responses_get_no_etag_from_html_hook(client):
+    """Test that errors and redirects are left alone."""
+    assert 'ETag' not in client.get('/does-not-exist').headers
+    assert 'ETag' not in client.post('/projects/add', data={'title': 'x'}).headers
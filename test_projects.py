@@ -2,6 +2,7 @@
 Tests for project CRUD operations and business logic.
 """
 import pytest
+import sqlite3
 import DAL
 
 
@@ -240,3 +241,56 @@ def test_long_text_handling(app):
     assert project['Description'] == long_description
     assert project['ImageFileName'] == image
 
+
+def test_get_projects_by_ids_batched(app, sample_projects):
+    """Test fetching several projects by id in the order requested."""
+    ids = [
+        DAL.save_project(p['title'], p['description'], p['image'])
+        for p in sample_projects
+    ]
+
+    projects = DAL.get_projects_by_ids([ids[2], ids[0], 99999, ids[2]])
+    assert [p['id'] for p in projects] == [ids[2], ids[0]]
+    assert projects[0]['Title'] == sample_projects[2]['title']
+    assert DAL.get_projects_by_ids([]) == []
+
+
+def test_get_project_ids(app, populated_database):
+    """Test listing project ids newest first."""
+    ids = DAL.get_project_ids()
+    assert len(ids) == len(populated_database)
+    assert ids == sorted(ids, reverse=True)
+
+
+def test_save_project_once_deduplicates_by_key(app):
+    """Test that a retried submission with the same key creates one project."""
+    events = []
+    listener = lambda event, project_id: events.append((event, project_id))
+    DAL.add_change_listener(listener)
+    try:
+        first_id, created = DAL.save_project_once("key-1", "Once", "Desc", "once.jpg")
+        again_id, created_again = DAL.save_project_once("key-1", "Once", "Desc", "once.jpg")
+    finally:
+        DAL.remove_change_listener(listener)
+
+    assert created is True and created_again is False
+    assert again_id == first_id
+    assert DAL.count_projects() == 1
+    assert events == [('save', first_id)]
+
+    other_id, created_other = DAL.save_project_once("key-2", "Once", "Desc", "once.jpg")
+    assert created_other is True and other_id != first_id
+
+
+def test_purge_idempotency_keys(app):
+    """Test that only keys older than the TTL are purged."""
+    DAL.save_project_once("old", "Old", "")
+    DAL.save_project_once("new", "New", "")
+    conn = sqlite3.connect(DAL.get_db_path())
+    conn.execute("UPDATE idempotency_keys SET CreatedAt = datetime('now', '-2 days') WHERE Key = 'old';")
+    conn.commit()
+    conn.close()
+
+    assert DAL.purge_idempotency_keys(86400) == 1
+    assert DAL.save_project_once("old", "Old again", "")[1] is True
+    assert DAL.save_project_once("new", "New", "")[1] is False
@@ -1,8 +1,11 @@
 """
 Tests for Flask application routes and HTTP endpoints.
 """
+import re
+
 import pytest
 from flask import url_for
+import DAL
 
 
 def test_index_route(client):
@@ -104,6 +107,33 @@ def test_projects_add_route_post_missing_fields(client):
     assert response.status_code == 302  # Should still succeed as description and image are optional
 
 
+def test_projects_add_form_has_idempotency_key(client):
+    """Test that each add form gets its own idempotency key."""
+    import re
+    keys = [
+        re.search(rb'name="idempotency_key" value="([0-9a-f]+)"', client.get('/projects/add').data).group(1)
+        for _ in range(2)
+    ]
+    assert keys[0] != keys[1]
+
+
+def test_projects_add_route_replays_duplicate_submission(client, sample_project):
+    """Test that a resubmitted form creates one project and replays the redirect."""
+    data = dict(sample_project, idempotency_key='retry-me')
+    first = client.post('/projects/add', data=data)
+    second = client.post('/projects/add', data=data)
+
+    assert first.status_code == second.status_code == 302
+    assert second.location == first.location
+    assert 'Idempotent-Replayed' not in first.headers
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert DAL.count_projects() == 1
+
+    header = client.post('/projects/add', data=sample_project, headers={'Idempotency-Key': 'retry-me'})
+    assert header.headers['Idempotent-Replayed'] == 'true'
+    assert DAL.count_projects() == 1
+
+
 def test_projects_route_with_projects(client, populated_database):
     """Test the projects route when projects exist in database."""
     response = client.get('/projects')
@@ -161,3 +191,121 @@ def test_navigation_links(client):
     assert b'href="/projects"' in response.data
     assert b'href="/contact"' in response.data
 
+
+def test_pages_share_base_layout(client):
+    """Test that every page renders the shared header, nav and footer."""
+    for path in ['/', '/about', '/resume', '/projects', '/contact', '/thankyou', '/projects/add']:
+        response = client.get(path)
+        assert response.status_code == 200
+        assert b'<header>' in response.data
+        assert b'href="/projects"' in response.data
+        assert b'&copy; 2025 Ankush Nehra' in response.data
+
+
+def test_nav_marks_current_page_active(client):
+    """Test that the nav highlights the page being viewed."""
+    response = client.get('/about')
+    assert b'<a href="/about" class="active">About</a>' in response.data
+    assert response.data.count(b'class="active"') == 1
+
+
+def test_projects_static_sections_rendered_once(client, app, populated_database):
+    """Test that the static sections of /projects are reused across requests."""
+    cache = app.extensions['fragment_cache']
+    client.get('/projects')
+    renders = cache.renders
+
+    for _ in range(3):
+        response = client.get('/projects')
+        assert b'Technical Skills Demonstrated' in response.data
+        assert b'Project 1' in response.data
+
+    assert cache.renders == renders
+
+
+def test_projects_route_sort_and_filter(client, populated_database):
+    """Test ?sort= and ?q= on the projects listing."""
+    response = client.get('/projects?sort=title&q=project 2')
+    assert response.status_code == 200
+    assert b'Project 2' in response.data
+    assert b'Project 1' not in response.data
+
+
+def test_projects_route_date_filter(client, populated_database):
+    """Test ?from=/?to= date-range filtering."""
+    response = client.get('/projects?from=2000-01-01&to=2000-01-31')
+    assert response.status_code == 200
+    assert b'No projects found' in response.data
+
+
+def test_projects_route_rejects_bad_filters(client):
+    """Test that unknown sort orders and malformed dates are rejected."""
+    assert client.get('/projects?sort=bogus').status_code == 400
+    assert client.get('/projects?from=yesterday').status_code == 400
+
+
+def test_projects_route_pagination(client, app, populated_database):
+    """Test that the listing is split into pages."""
+    app.config['PROJECTS_PAGE_SIZE'] = 2
+    try:
+        first = client.get('/projects')
+        assert b'Project 3' in first.data
+        assert b'Project 1' not in first.data
+        assert b'href="/projects/page/2"' in first.data
+
+        second = client.get('/projects/page/2')
+        assert second.status_code == 200
+        assert b'Project 1' in second.data
+
+        assert client.get('/projects/page/3').status_code == 404
+    finally:
+        app.config['PROJECTS_PAGE_SIZE'] = 50
+
+
+@pytest.mark.parametrize('page', [2 ** 63 // 50, 99999999999999999999])
+def test_projects_route_huge_page_is_not_found(client, populated_database, page):
+    """Test that a page number whose offset overflows SQLite's INTEGER is a 404, not a 500."""
+    assert client.get(f'/projects/page/{page}').status_code == 404
+
+
+@pytest.mark.parametrize('query', ['', '?sort=title&q=Project', '?page=7', '?_external=1&_anchor=x&sort=title'])
+def test_projects_pager_links_can_be_followed(client, app, populated_database, monkeypatch, query):
+    """Test that Next and Previous links render and lead to the neighbouring pages with the same filters."""
+    monkeypatch.setitem(app.config, 'PROJECTS_PAGE_SIZE', 2)
+    first = client.get('/projects' + query)
+    assert first.status_code == 200
+    next_href = re.search(rb'<a href="([^"]+)" rel="next">Next', first.data).group(1).decode().replace('&amp;', '&')
+    assert next_href.startswith('/projects/page/2')
+    assert 'page=' not in next_href and '_external' not in next_href and '_anchor' not in next_href
+    if 'sort=title' in query:
+        assert 'sort=title' in next_href
+
+    second = client.get(next_href)
+    assert second.status_code == 200
+    prev_href = re.search(rb'<a href="([^"]+)" rel="prev">', second.data).group(1).decode().replace('&amp;', '&')
+    assert client.get(prev_href, follow_redirects=True).status_code == 200
+
+
+def test_project_detail_route(client, app, sample_project):
+    """Test the per-project detail page."""
+    project_id = DAL.save_project(
+        sample_project['title'],
+        sample_project['description'],
+        sample_project['image']
+    )
+    response = client.get(f'/projects/{project_id}')
+    assert response.status_code == 200
+    assert sample_project['title'].encode() in response.data
+    assert sample_project['description'].encode() in response.data
+
+
+def test_project_detail_route_not_found(client):
+    """Test that unknown project ids return 404."""
+    assert client.get('/projects/99999').status_code == 404
+
+
+def test_projects_listing_links_to_detail_pages(client, populated_database):
+    """Test that listing rows link to their detail pages."""
+    project_id = DAL.get_all_projects()[0]['id']
+    response = client.get('/projects')
+    assert f'href="/projects/{project_id}"'.encode() in response.data
@@ -0,0 +1,156 @@
+"""
+Tests for the host-wide page cache shared by worker processes through a SQLite file.
+"""
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+from flask import template_rendered
+
+import DAL
+import sharedcache
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / 'pages.db')
+
+
+def test_workers_share_pages_and_invalidations(cache_path):
+    """Test that a page stored by one worker is served to another until either invalidates it."""
+    worker_a = sharedcache.SharedPageCache(cache_path)
+    worker_b = sharedcache.SharedPageCache(cache_path)
+    renders = []
+
+    def render():
+        renders.append(1)
+        return b'<html>page</html>'
+
+    assert worker_a.get_or_render('/projects', 'db1', render) == (b'<html>page</html>', 'miss')
+    assert worker_b.get_or_render('/projects', 'db1', render) == (b'<html>page</html>', 'hit')
+    assert worker_b.get('/projects', 'db2') is None
+
+    worker_b.invalidate('db1')
+    assert worker_a.get('/projects', 'db1') is None
+    assert worker_a.get_or_render('/projects', 'db1', render)[1] == 'miss'
+    assert len(renders) == 2
+
+
+def test_render_racing_a_write_is_not_served(cache_path):
+    """Test that a page rendered while a write landed is stored already stale."""
+    cache = sharedcache.SharedPageCache(cache_path)
+
+    def render():
+        cache.invalidate('db')  # another worker writes mid-render
+        return b'old'
+
+    assert cache.get_or_render('/projects', 'db', render) == (b'old', 'miss')
+    assert cache.get('/projects', 'db') is None
+
+
+def test_concurrent_misses_render_once_per_host(cache_path):
+    """Test that workers missing on the same key wait for a single render."""
+    workers = [sharedcache.SharedPageCache(cache_path) for _ in range(4)]
+    renders = []
+    results = []
+
+    def render():
+        renders.append(1)
+        time.sleep(0.1)
+        return b'rendered once'
+
+    threads = [
+        threading.Thread(target=lambda w=w: results.append(w.get_or_render('/about', 'static', render)))
+        for w in workers
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(renders) == 1
+    assert sorted(status for _, status in results) == ['coalesced', 'coalesced', 'coalesced', 'miss']
+    assert {body for body, _ in results} == {b'rendered once'}
+
+
+def test_failed_render_hands_the_lease_on(cache_path):
+    """Test that a render error releases the lease so the next worker renders."""
+    cache = sharedcache.SharedPageCache(cache_path)
+
+    def broken():
+        raise RuntimeError('template error')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_render('/about', 'static', broken)
+    assert cache.get_or_render('/about', 'static', lambda: b'ok') == (b'ok', 'miss')
+
+
+def test_least_recently_used_pages_are_evicted(cache_path):
+    """Test that eviction keeps the most recently used pages."""
+    cache = sharedcache.SharedPageCache(cache_path, max_entries=2, touch_interval=0)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, 'db', 0, key.encode())
+        time.sleep(0.01)
+    cache.get('a', 'db')
+
+    assert cache.evict() == 1
+    assert cache.get('b', 'db') is None
+    assert cache.get('a', 'db') == b'a' and cache.get('c', 'db') == b'c'
+    assert cache.stats() == {'entries': 2, 'bytes': 2}
+
+
+@pytest.fixture
+def shared_app(app, cache_path, monkeypatch):
+    """The app with the shared tier on, plus a second handle on the file standing in for another worker."""
+    app_module = sys.modules['app']
+    cache = sharedcache.SharedPageCache(cache_path)
+    monkeypatch.setattr(app_module, 'shared_pages', cache)
+    DAL.add_change_listener(cache.on_change)
+    renders = []
+
+    def record(sender, template, context, **extra):
+        renders.append(template.name)
+
+    template_rendered.connect(record, app)
+    yield app_module, sharedcache.SharedPageCache(cache_path), renders
+    template_rendered.disconnect(record, app)
+    DAL.remove_change_listener(cache.on_change)
+
+
+def test_static_pages_render_once_per_host(client, shared_app):
+    """Test that static pages are served from the shared tier after the first render."""
+    _, other_worker, renders = shared_app
+    first = client.get('/about')
+    second = client.get('/about')
+
+    assert second.data == first.data
+    assert renders.count('about.html') == 1
+    assert other_worker.stats()['entries'] == 1
+
+
+def test_projects_page_shared_and_invalidated_across_workers(client, shared_app, populated_database):
+    """Test that listings render once per change and writes by any worker reach every worker."""
+    app_module, other_worker, renders = shared_app
+    assert b'Project 1' in client.get('/projects').data
+    assert renders.count('projects.html') == 1
+
+    # A worker with an empty in-process cache is served from the shared tier
+    app_module.page_cache.invalidate()
+    client.get('/projects')
+    assert renders.count('projects.html') == 1
+
+    # A write in another worker bumps the generation; neither this worker's page nor its rows are reused
+    db = sqlite3.connect(DAL.get_db_path())
+    db.execute("INSERT INTO projects (Title, Description, ImageFileName) VALUES ('Other Worker Project', '', '');")
+    db.commit()
+    db.close()
+    other_worker.invalidate(DAL.get_db_path())
+    assert b'Other Worker Project' in client.get('/projects').data
+    assert renders.count('projects.html') == 2
+
+    # A write in this worker invalidates the shared tier too
+    DAL.save_project('Fresh Project', '', '')
+    assert b'Fresh Project' in client.get('/projects').data
+    assert renders.count('projects.html') == 3
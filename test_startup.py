@@ -0,0 +1,103 @@
+"""
+Tests for cold-start behaviour: deferred DB setup, template precompilation
+and the startup time budget.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import startup
+
+
+APP_DIR = os.path.join(os.path.dirname(__file__), 'flask_app')
+
+# Seconds a fresh process may take to import the app and serve its first page.
+COLD_START_BUDGET = float(os.environ.get('COLD_START_BUDGET_SECONDS', '3.0'))
+
+COLD_START_SCRIPT = """
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {app_dir!r})
+import app
+imported = time.perf_counter() - t0
+db_created_on_import = os.path.exists(os.environ['PROJECTS_DB_PATH'])
+response = app.app.test_client().get('/projects')
+print(json.dumps({{
+    'imported': imported,
+    'first_response': time.perf_counter() - t0,
+    'status': response.status_code,
+    'db_created_on_import': db_created_on_import,
+    'phases': app.startup_timer.report(),
+}}))
+"""
+
+
+def _cold_start(tmp_path):
+    env = dict(os.environ)
+    env['PROJECTS_DB_PATH'] = str(tmp_path / 'cold.db')
+    env['TEMPLATE_CACHE_DIR'] = str(tmp_path / 'jinja-cache')
+    result = subprocess.run(
+        [sys.executable, '-c', COLD_START_SCRIPT.format(app_dir=APP_DIR)],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.slow
+def test_cold_start_within_budget(tmp_path):
+    """Test that a fresh process imports the app and serves /projects within budget."""
+    stats = _cold_start(tmp_path)
+    assert stats['status'] == 200
+    assert stats['first_response'] < COLD_START_BUDGET, stats
+
+
+@pytest.mark.slow
+def test_db_setup_deferred_until_first_request(tmp_path):
+    """Test that importing the app does not touch the database."""
+    stats = _cold_start(tmp_path)
+    assert stats['db_created_on_import'] is False
+    assert 'imports' in stats['phases']
+    assert 'db_init' in stats['phases']
+
+
+def test_precompile_templates_fills_bytecode_cache(app, tmp_path):
+    """Test that precompiling writes every template to the bytecode cache."""
+    cache_dir = tmp_path / 'bytecode'
+    original_cache = app.jinja_env.bytecode_cache
+    startup.configure_bytecode_cache(app, str(cache_dir))
+    app.jinja_env.cache.clear()
+    try:
+        count = startup.precompile_templates(app)
+    finally:
+        app.jinja_env.bytecode_cache = original_cache
+        app.jinja_env.cache.clear()
+
+    assert count >= 6
+    assert len(os.listdir(cache_dir)) == count
+
+
+def test_deferred_init_runs_once():
+    """Test that DeferredInit runs its setup exactly once."""
+    calls = []
+    timer = startup.StartupTimer()
+    init = startup.DeferredInit(lambda: calls.append(1), timer=timer)
+
+    init.start_background().join()
+    init.ensure()
+    init.ensure()
+
+    assert calls == [1]
+    assert init.done
+    assert 'db_init' in timer.report()
+
+
+def test_warm_up_reports_phases(app):
+    """Test that warm_up reports template and DB timings."""
+    timer = startup.StartupTimer()
+    init = startup.DeferredInit(lambda: None, timer=timer)
+    report = startup.warm_up(app, init, timer)
+    assert {'templates', 'db_init', 'ready'} <= set(report)
+    assert 'templates' in timer.format()
@@ -0,0 +1,133 @@
+"""
+Tests for per-tenant databases: request routing, the connection pool and cross-shard queries.
+"""
+import os
+
+import pytest
+
+import DAL
+import tenants
+
+
+@pytest.fixture
+def tenant_app(app, tmp_path, monkeypatch):
+    """The app with path-prefix tenant routing, shards in a temporary directory."""
+    tenant_dir = str(tmp_path / 'tenants')
+    monkeypatch.setitem(app.config, 'TENANT_DIR', tenant_dir)
+    monkeypatch.setattr(app, 'wsgi_app', tenants.TenantMiddleware(app.wsgi_app, 'path', allowed=['alice', 'bob']))
+    return app, tenant_dir
+
+
+def test_path_prefix_routes_to_the_tenant_shard(tenant_app):
+    """Test that /t/<tenant> requests use that tenant's own database."""
+    app, tenant_dir = tenant_app
+    client = app.test_client()
+    assert tenants.create_shard(tenant_dir, 'alice') is True
+    assert tenants.create_shard(tenant_dir, 'bob') is True
+    assert tenants.create_shard(tenant_dir, 'bob') is False
+    assert tenants.list_shards(tenant_dir) == ['alice', 'bob']
+
+    response = client.post('/t/alice/projects/add', data={'title': 'Alice Project'})
+    assert response.status_code == 302
+    assert response.headers['Location'] == '/t/alice/projects'
+
+    alice = client.get('/t/alice/projects').data
+    assert b'Alice Project' in alice
+    assert b'href="/t/alice/projects/add"' in alice
+    assert b'href="/t/alice/about"' in alice
+    assert b'Alice Project' not in client.get('/t/bob/projects').data
+    assert b'Alice Project' not in client.get('/projects').data
+    with DAL.use_db_path(tenants.shard_path(tenant_dir, 'bob')):
+        assert DAL.get_schema_version() == DAL.SCHEMA_VERSION
+        assert DAL.count_projects() == 0
+
+
+def test_tenant_without_a_shard_is_not_created(app, tmp_path, monkeypatch):
+    """Test that a valid name with no database gets a 404 and leaves no file, even without an allowlist."""
+    tenant_dir = str(tmp_path / 'tenants')
+    monkeypatch.setitem(app.config, 'TENANT_DIR', tenant_dir)
+    monkeypatch.setattr(app, 'wsgi_app', tenants.TenantMiddleware(app.wsgi_app, 'path'))
+    client = app.test_client()
+
+    assert client.get('/t/mallory/projects').status_code == 404
+    assert client.post('/t/mallory/projects/add', data={'title': 'Spam'}).status_code == 404
+    assert tenants.list_shards(tenant_dir) == []
+    assert not os.path.exists(tenants.shard_path(tenant_dir, 'mallory'))
+
+
+def test_default_site_links_are_unprefixed(tenant_app):
+    """Test that pages outside a tenant prefix keep their plain links."""
+    app, _ = tenant_app
+    response = app.test_client().get('/about')
+    assert b'href="/contact"' in response.data
+    assert b'/t/' not in response.data
+
+
+@pytest.mark.parametrize('path', ['/t/carol/projects', '/t/Alice/projects', '/t/../projects', '/t/-x/'])
+def test_unknown_or_invalid_tenants_are_rejected(tenant_app, path):
+    """Test that names outside the allowlist or the safe pattern never reach a database."""
+    app, tenant_dir = tenant_app
+    assert app.test_client().get(path).status_code == 404
+    assert not os.path.exists(tenant_dir)
+
+
+def test_host_mode_reads_the_subdomain():
+    """Test that host mode takes the label before the suffix and ignores other hosts."""
+    seen = {}
+
+    def wsgi(environ, start_response):
+        seen['tenant'] = environ.get(tenants.ENVIRON_KEY)
+        start_response('200 OK', [])
+        return [b'']
+
+    middleware = tenants.TenantMiddleware(wsgi, 'host', host_suffix='portfolios.example')
+    for host, expected in [('alice.portfolios.example:8080', 'alice'), ('portfolios.example', None), ('other.test', None)]:
+        middleware({'HTTP_HOST': host, 'PATH_INFO': '/'}, lambda *a: None)
+        assert seen['tenant'] == expected
+    with pytest.raises(ValueError):
+        tenants.TenantMiddleware(wsgi, 'host')
+
+
+def test_pool_reuses_and_bounds_connections(tmp_path):
+    """Test that connections are reused per shard and the least recently used are closed."""
+    pool = DAL.ConnectionPool(max_idle=2)
+    paths = [str(tmp_path / f'{name}.db') for name in 'abc']
+    first = pool.acquire(paths[0])
+    pool.release(paths[0], first)
+    assert pool.acquire(paths[0]) is first
+    pool.release(paths[0], first)
+    for path in paths[1:]:
+        pool.release(path, pool.acquire(path))
+    assert pool.stats() == {'idle': 2, 'shards': 2, 'opened': 3, 'reused': 1}
+    with pytest.raises(Exception):
+        first.execute('SELECT 1;')  # evicted and closed
+    pool.close_all()
+    assert pool.stats()['idle'] == 0
+
+
+def test_failed_write_does_not_leak_a_transaction(app):
+    """Test that a pooled connection comes back usable after an error mid-transaction."""
+    with pytest.raises(RuntimeError):
+        with DAL._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE;")
+            conn.execute("INSERT INTO projects (Title) VALUES ('half done');")
+            raise RuntimeError
+    assert DAL.count_projects() == 0
+    DAL.save_project('Saved', 'after the error')
+    assert DAL.count_projects() == 1
+
+
+def test_fan_out_queries_every_shard(tmp_path):
+    """Test that cross-shard queries run against each tenant and report per-shard failures."""
+    tenant_dir = str(tmp_path)
+    for name, count in [('alice', 2), ('bob', 1)]:
+        with DAL.use_db_path(tenants.shard_path(tenant_dir, name)):
+            DAL.ensure_db()
+            for i in range(count):
+                DAL.save_project(f'{name} {i}', '')
+    open(os.path.join(tenant_dir, 'broken.db'), 'w').write('not a database')
+
+    results = tenants.fan_out(tenant_dir, DAL.count_projects)
+    assert results['alice'] == 2 and results['bob'] == 1
+    assert isinstance(results['broken'], Exception)
+    DAL.pool.close_all()
@@ -0,0 +1,157 @@
+"""
+Tests for request tracing: traceparent handling, sampling, span structure and export.
+"""
+import ipaddress
+import json
+
+import pytest
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import tracing
+
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+
+
+def test_parse_traceparent():
+    """Test parsing valid and invalid W3C traceparent headers."""
+    assert tracing.parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-01') == (TRACE_ID, PARENT_ID, True)
+    assert tracing.parse_traceparent(f'00-{TRACE_ID}-{PARENT_ID}-00') == (TRACE_ID, PARENT_ID, False)
+    assert tracing.parse_traceparent(f'00-{"0" * 32}-{PARENT_ID}-01') is None
+    assert tracing.parse_traceparent('garbage') is None
+    assert tracing.parse_traceparent(None) is None
+
+
+def test_should_sample_is_deterministic_per_trace():
+    """Test that the sampling decision depends only on the trace id and rate."""
+    assert tracing.should_sample(TRACE_ID, 1.0)
+    assert not tracing.should_sample(TRACE_ID, 0.0)
+    assert tracing.should_sample(TRACE_ID, 0.5) == tracing.should_sample(TRACE_ID, 0.5)
+
+
+@pytest.fixture
+def tracer(app, monkeypatch):
+    """Attach a tracer that collects exported traces in a list."""
+    exported = []
+    tracer = tracing.Tracer(exported.append, sample_rate=1.0)
+    # Hooks are attached per test, after the app has served requests
+    monkeypatch.setattr(app, '_got_first_request', False)
+    monkeypatch.setattr(app, 'before_request_funcs', {k: list(v) for k, v in app.before_request_funcs.items()})
+    monkeypatch.setattr(app, 'after_request_funcs', {k: list(v) for k, v in app.after_request_funcs.items()})
+    monkeypatch.setattr(tracing.DAL, '_call_hooks', [])
+    tracer.init_app(app)
+    yield tracer, exported
+    tracing.before_render_template.disconnect(tracer._start_render, app)
+    tracing.template_rendered.disconnect(tracer._finish_render, app)
+
+
+def test_request_span_tree(client, tracer, populated_database):
+    """Test that a /projects miss records request, DAL (with connect) and render spans."""
+    tracer, exported = tracer
+    # Start with no idle pooled connection so the query has to open one
+    tracing.DAL.pool.close_all()
+    response = client.get('/projects')
+
+    (spans,) = exported
+    by_name = {s['name']: s for s in spans}
+    root = by_name['GET /projects']
+    assert root['parent_id'] == '' and root['kind'] == tracing.KIND_SERVER
+    assert root['attributes']['http.status_code'] == 200
+    assert root['attributes']['cache.status'] == 'miss'
+    assert response.headers['traceparent'] == f"00-{root['trace_id']}-{root['span_id']}-01"
+
+    query = by_name['query_projects']
+    connect = by_name['connect']
+    render = by_name['render projects.html']
+    assert query['parent_id'] == root['span_id']
+    assert connect['parent_id'] == query['span_id']
+    assert render['parent_id'] == root['span_id']
+    for span in spans:
+        assert span['trace_id'] == root['trace_id']
+        assert root['start_ns'] <= span['start_ns'] <= span['end_ns'] <= root['end_ns']
+    assert query['start_ns'] <= connect['start_ns'] and connect['end_ns'] <= query['end_ns']
+
+
+def test_incoming_traceparent_is_continued(client, tracer):
+    """Test that a request continues a trusted caller's trace and respects its sampled flag."""
+    tracer, exported = tracer
+    tracer.trusted_upstreams = [ipaddress.ip_network('127.0.0.0/8')]
+    response = client.get('/about', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01'})
+    root = exported[0][0]
+    assert root['trace_id'] == TRACE_ID and root['parent_id'] == PARENT_ID
+    assert response.headers['traceparent'].startswith(f'00-{TRACE_ID}-')
+
+    client.get('/about', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-00'})
+    assert len(exported) == 1
+
+
+def test_untrusted_sampled_flag_is_capped_by_local_rate(client, tracer):
+    """Test that a client's sampled flag cannot force its requests to be recorded and exported."""
+    tracer, exported = tracer
+    tracer.sample_rate = 0.0
+    tracer.trusted_upstreams = [ipaddress.ip_network('10.0.0.0/8')]
+    for _ in range(5):
+        response = client.get('/about', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01'})
+    assert exported == []
+    assert response.headers.get('traceparent') is None
+
+    client.get('/about', headers={'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01'},
+               environ_base={'REMOTE_ADDR': '10.1.2.3'})
+    assert exported[0][0]['trace_id'] == TRACE_ID
+
+
+def test_trusted_upstream_is_the_peer_behind_proxy_fix(app, tracer, monkeypatch):
+    """Test that trust is decided by the proxy's own address, not the forwarded client address."""
+    tracer, exported = tracer
+    tracer.sample_rate = 0.0
+    tracer.trusted_upstreams = [ipaddress.ip_network('10.0.0.2')]
+    monkeypatch.setattr(app, 'wsgi_app', ProxyFix(app.wsgi_app, x_for=1))
+    client = app.test_client()
+    headers = {'traceparent': f'00-{TRACE_ID}-{PARENT_ID}-01', 'X-Forwarded-For': '203.0.113.9'}
+
+    response = client.get('/about', headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert exported[0][0]['trace_id'] == TRACE_ID
+    assert response.headers['traceparent'].startswith(f'00-{TRACE_ID}-')
+
+    headers['X-Forwarded-For'] = '10.0.0.2'
+    client.get('/about', headers=headers, environ_base={'REMOTE_ADDR': '203.0.113.9'})
+    assert len(exported) == 1
+
+
+def test_slow_requests_exported_when_not_sampled(client, tracer, monkeypatch):
+    """Test that unsampled requests are exported only when slower than the threshold."""
+    tracer, exported = tracer
+    tracer.sample_rate = 0.0
+    client.get('/about')
+    assert exported == []
+
+    tracer.slow_ms = 0.000001
+    client.get('/about')
+    (spans,) = exported
+    assert spans[0]['attributes']['sampling.reason'] == 'slow'
+
+
+def test_to_otlp_shape():
+    """Test conversion to the OTLP/HTTP JSON body."""
+    spans = [
+        {'trace_id': TRACE_ID, 'span_id': PARENT_ID, 'parent_id': '', 'name': 'GET /', 'kind': 2,
+         'start_ns': 1, 'end_ns': 2, 'attributes': {'http.status_code': 200, 'cache.status': None}},
+        {'trace_id': TRACE_ID, 'span_id': 'b7ad6b7169203331', 'parent_id': PARENT_ID, 'name': 'connect', 'kind': 1,
+         'start_ns': 1, 'end_ns': 2, 'attributes': {'error': 'OperationalError'}},
+    ]
+    body = tracing.to_otlp(spans)
+    root, child = body['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert 'parentSpanId' not in root and child['parentSpanId'] == PARENT_ID
+    assert root['attributes'] == [{'key': 'http.status_code', 'value': {'intValue': '200'}}]
+    assert root['startTimeUnixNano'] == '1'
+    assert child['status'] == {'code': 2}
+    json.dumps(body)
+
+
+def test_file_exporter_writes_one_line_per_span(tmp_path):
+    """Test the file exporter's JSON lines output."""
+    path = str(tmp_path / 'spans.jsonl')
+    tracing.file_exporter(path)([[{'name': 'a'}, {'name': 'b'}], [{'name': 'c'}]])
+    with open(path) as f:
+        assert [json.loads(line)['name'] for line in f] == ['a', 'b', 'c']